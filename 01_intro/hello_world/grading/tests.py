@@ -1,36 +1,31 @@
 #!/usr/bin/env python3
 
 # Scaffolding necessary to set up ACCESS test
-import sys
-try: from universal.harness import *
-except: sys.path.append("../../universal/"); from harness import *
+import os, sys
+sys.path.append("universal" if os.path.isdir("universal") else "../../universal")
+from harness import *
 
 # Grading test suite starts here
-from io import StringIO
 
 class GradingTests(AccessTestCase):
     """This particular test case is a bit special, because we need to capture
-       output that happens during the solution import. The import only happens
-       once, so we capture the output and read it in the test methods."""
-    output = None
+       output that happens during the solution import. The suite isolates the
+       tests, so every test imports the solution afresh and captures its output."""
 
     def import_script(self):
-        if GradingTests.output == None:
-            capture = StringIO()
-            sys.stdout = capture
-            implementation = grading_import("task", "script")
-            sys.stdout = sys.__stdout__
-            GradingTests.output = capture.getvalue()
+        with CapturedOutput() as output:
+            grading_import("task", "script")
+        return output
 
     @weight(0)
     def test_prints_something(self):
-        self.import_script()
+        output = self.import_script()
         self.hint("The script does not produce any output. Are you printing something?")
-        self.assertGreater(len(GradingTests.output), 0)
+        self.assertGreater(output.total, 0)
 
     def test_prints_hello_world(self):
-        self.import_script()
+        output = self.import_script()
         self.hint("The output is not 'Hello, World!'")
-        self.assertEqual(GradingTests.output, "Hello, World!\n")
+        self.assertEqual(output.getvalue(), "Hello, World!\n")
 
-TestRunner().run(AccessTestSuite(1, [GradingTests]))
+TestRunner().run(AccessTestSuite(1, [GradingTests], isolate=True))
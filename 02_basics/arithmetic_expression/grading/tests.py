@@ -1,31 +1,33 @@
 #!/usr/bin/env python3
 
 # Scaffolding necessary to set up ACCESS test
-import sys
-try: from universal.harness import *
-except: sys.path.append("../../universal/"); from harness import *
+import os, sys
+sys.path.append("universal" if os.path.isdir("universal") else "../../universal")
+from harness import *
 
 # Grading test suite starts here
 
 script = grading_import("task", "script")
+reference = reference_import("script")
 
-class GradingTests(AccessTestCase):
-
-    def _test(self, a, b, c, d, expected):
-        actual = script.calculate(a, b, c, d)
-        self.hint("Calculation not correct for a={}, b={}, c={}, d={}... expected result is {}!".format(a, b, c, d, expected))
-        self.assertAlmostEqual(expected, actual, 5)
-
-    def test_case1(self):
-        self._test(1, 2, 3, 4, 1.444444)
+def close(actual, expected):
+    return round(abs(expected - actual), 5) == 0
 
-    def test_case2(self):
-        self._test(2, 3, 4, 5, 2.428571)
-
-    def test_case3(self):
-        self._test(3, 4, 5, 6, 3.432432)
+class GradingTests(AccessTestCase):
 
-    def test_case4(self):
-        self._test(4, 5, 6, 7, 4.438596)
+    @cases([
+        Case((1, 2, 3, 4), 1.444444),
+        Case((2, 3, 4, 5), 2.428571),
+        Case((3, 4, 5, 6), 3.432432),
+        Case((4, 5, 6, 7), 4.438596),
+    ], hint="Calculation not correct for a={0}, b={1}, c={2}, d={3}... expected result is {expected}!",
+       check=close)
+    def test_calculate(self, case):
+        return script.calculate(*case.args)
+
+    # Feedback only, so the points stay those of the cases above
+    @weight(0)
+    def test_random_inputs(self):
+        self.fuzz(script.calculate, reference.calculate, *[Integers(-10, 10)] * 4, cases=500, check=close)
 
 TestRunner().run(AccessTestSuite(1, [GradingTests]))
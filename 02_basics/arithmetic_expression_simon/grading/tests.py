@@ -1,9 +1,9 @@
 #!/usr/bin/env python3
 
 # Scaffolding necessary to set up ACCESS test
-import sys
-try: from universal.harness import *
-except: sys.path.append("../../universal/"); from harness import *
+import os, sys
+sys.path.append("universal" if os.path.isdir("universal") else "../../universal")
+from harness import *
 
 # Grading test suite starts here
 
@@ -11,21 +11,14 @@ script = grading_import("task", "script")
 
 class GradingTests(AccessTestCase):
 
-    def _test(self, a, b, c, d, expected):
-        actual = script.calculate(a, b, c, d)
-        self.hint("Calculation not correct for a={}, b={}, c={}, d={}... expected result is {}!".format(a, b, c, d, expected))
-        self.assertAlmostEqual(expected, actual, 5)
-
-    def test_case1(self):
-        self._test(1, 2, 3, 4, 0.428571)
-
-    def test_case2(self):
-        self._test(2, 3, 4, 5, 1.187070)
-
-    def test_case3(self):
-        self._test(3, 4, 5, 6, 1.960519)
-
-    def test_case4(self):
-        self._test(4, 5, 6, 7, 2.75)
+    @cases([
+        Case((1, 2, 3, 4), 0.428571),
+        Case((2, 3, 4, 5), 1.187070),
+        Case((3, 4, 5, 6), 1.960519),
+        Case((4, 5, 6, 7), 2.75),
+    ], hint="Calculation not correct for a={0}, b={1}, c={2}, d={3}... expected result is {expected}!",
+       check=lambda actual, expected: round(abs(expected - actual), 5) == 0)
+    def test_calculate(self, case):
+        return script.calculate(*case.args)
 
 TestRunner().run(AccessTestSuite(1, [GradingTests]))
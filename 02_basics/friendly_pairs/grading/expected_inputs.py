@@ -0,0 +1,18 @@
+# Inputs for which universal/expected.py precomputes the results of the sample
+# solution into grading/expected.dat, see universal/README.md
+INPUTS = {
+    "script.is_friendly_pair": [
+        (6, 28),
+        (4320, 4680),
+        (24, 91963648),
+        (2, 5),
+        (14326, 4999),
+        (20, 20),
+        (-20, -20),
+        (0.99, 28),
+        (6, 0.99),
+        (2.6, 28),
+        (28, 2.6),
+        (6.1, 7.1),
+    ],
+}
@@ -1,9 +1,36 @@
 #!/usr/bin/env python3
-import sys
-try: from universal.harness import *
-except: sys.path.append("../../universal/"); from harness import *
-
-implementation = grading_import("task", "script")
+import os, sys
+sys.path.append("universal" if os.path.isdir("universal") else "../../universal")
+from harness import *
+
+implementation = grading_import("task", "script", requires=["is_friendly_pair"])
+reference = reference_import("script")
+
+def friendly_hint(case, actual):
+    num1, num2 = case.args
+    if actual == False:
+        return "{} and {} are wrongly detected as not friendly pair even though they are.".format(num1, num2)
+    return "For the numbers {} and {} the function should return {}, but it returns {}.".format(num1, num2, repr(True), actual)
+
+def not_friendly_hint(case, actual):
+    num1, num2 = case.args
+    if actual == True:
+        return "{} and {} are wrongly detected as friendly pair even though they are not.".format(num1, num2)
+    return "For the numbers {} and {} the function should return {}, but it returns {}.".format(num1, num2, repr(False), actual)
+
+def pair(name, num1, num2):
+    """A case whose expected result is precomputed from the sample solution"""
+    expected = expected_value("script.is_friendly_pair", num1, num2)
+    if expected == "Invalid":
+        hint = "For the numbers {0} and {1} the function should return 'Invalid' but it returns {actual}."
+    else:
+        hint = friendly_hint if expected else not_friendly_hint
+    return Case((num1, num2), expected, name=name, hint=hint)
+
+def valid(name, num1, num2):
+    return Case((num1, num2), "Invalid", name=name, check=lambda actual, expected: actual != expected,
+                hint="For the numbers {0} and {1} received {actual} even though they are valid numbers . \
+        To be valid they must be different natural numbers.")
 
 class GradingTests(AccessTestCase):
 
@@ -21,113 +48,31 @@ class GradingTests(AccessTestCase):
             raise type(e)(message)
 
 
-    def assert_friendly(self, num1, num2):
-        actual = self.is_friendly_pair(num1, num2)
-        expected = True
-        if actual == False:
-            message = "{} and {} are wrongly detected as not friendly pair even though they are.".format(num1, num2)
-        else :
-            message = "For the numbers {} and {} the function should return {}, but it returns {}.".format(num1, num2, repr(expected), actual)
-        self.hint(message)
-        self.assertTrue(actual == True)
-
-    def assert_not_friendly(self, num1, num2):
-        actual = self.is_friendly_pair(num1, num2) 
-        expected = False
-        if actual == True:
-            message = "{} and {} are wrongly detected as friendly pair even though they are not.".format(num1, num2, expected, actual)
-        else :
-            message = "For the numbers {} and {} the function should return {}, but it returns {}.".format(num1, num2, repr(expected), actual)
-        self.hint(message)
-        self.assertTrue(actual == False)
-
-    def assert_invalid(self, num1, num2):
-        actual = self.is_friendly_pair(num1, num2)
-        expected = "Invalid"
-        self.hint("For the numbers {} and {} the function should return {} but it returns {}.".format(num1, num2, repr(expected), actual))
-        self.assertEqual(actual, expected)
-
-    def assert_valid(self, num1, num2):
-        actual = self.is_friendly_pair(num1, num2)
-        notExpected = "Invalid"
-        self.hint("For the numbers {} and {} received {} even though they are valid numbers . \
-        To be valid they must be different natural numbers.".format(num1, num2, actual))
-        self.assertNotEqual(actual, notExpected)
-
-    def test_simple_friendly_pair(self):
-        num1 = 6
-        num2 = 28 
-        self.assert_friendly(num1, num2)
-
-    def test_medium_friendly_pair(self):
-        num1 = 4320
-        num2 = 4680  
-        self.assert_friendly(num1, num2)
-
-    def test_hard_friendly_pair(self):
-        num1 = 24
-        num2 = 91963648
-        self.assert_friendly(num1, num2)
-
-    def test_simple_not_friendly_pair(self):
-        num1 = 2
-        num2 = 5
-        self.assert_not_friendly(num1, num2)
-
-    def test_hard_not_friendly_pair(self):
-        num1 = 14326
-        num2 = 4999
-        self.assert_not_friendly(num1, num2)
-
-    def test_invalid_sameNumbers(self):
-        num1 = 20
-        num2 = 20
-        self.assert_invalid(num1, num2)
-
-    def test_invalid_negative_sameNumbers(self):
-        num1 = -20
-        num2 = -20
-        self.assert_invalid(num1, num2)     
-
-    def test_invalid_off_point_num1(self):
-        num1 = 0.99
-        num2 = 28 
-        self.assert_invalid(num1, num2)
-
-    def test_valid_on_point_num1(self):
-        num1 = 1
-        num2 = 28
-        self.assert_valid(num1, num2)
-
-    def test_invalid_off_point_num2(self):
-        num1 = 6
-        num2 = 0.99
-        self.assert_invalid(num1, num2)
-
-    def test_valid_on_point_num2(self):
-        num1 = 28
-        num2 = 1
-        self.assert_valid(num1, num2)
-
-    def test_valid_out_point_num1(self):
-        num1 = 28
-        num2 = 2 
-        self.assert_valid(num1, num2)
-
-    def test_invalid_float_num1(self):
-        num1 = 2.6
-        num2 = 28
-        self.assert_invalid(num1, num2)
-
-    def test_invalid_float_num2(self):
-        num1 = 28
-        num2 = 2.6
-        self.assert_invalid(num1, num2)
-
-    def test_invalid_float_num1_num2(self):
-        num1 = 6.1
-        num2 = 7.1
-        self.assert_invalid(num1, num2)
+    @cases([
+        pair("simple_friendly_pair", 6, 28),
+        pair("medium_friendly_pair", 4320, 4680),
+        pair("hard_friendly_pair", 24, 91963648),
+        pair("simple_not_friendly_pair", 2, 5),
+        pair("hard_not_friendly_pair", 14326, 4999),
+        pair("invalid_sameNumbers", 20, 20),
+        pair("invalid_negative_sameNumbers", -20, -20),
+        pair("invalid_off_point_num1", 0.99, 28),
+        valid("valid_on_point_num1", 1, 28),
+        pair("invalid_off_point_num2", 6, 0.99),
+        valid("valid_on_point_num2", 28, 1),
+        valid("valid_out_point_num1", 28, 2),
+        pair("invalid_float_num1", 2.6, 28),
+        pair("invalid_float_num2", 28, 2.6),
+        pair("invalid_float_num1_num2", 6.1, 7.1),
+    ])
+    def test_is_friendly_pair(self, case):
+        return self.is_friendly_pair(*case.args)
+
+    # Feedback only, the instructions do not ask for an efficient solution
+    @weight(0)
+    def test_performance(self):
+        self.reject_template(implementation.is_friendly_pair)
+        self.assert_performance(implementation.is_friendly_pair, reference.is_friendly_pair, 4320, 999999, factor=20)
 
 TestRunner().run(AccessTestSuite(2, [GradingTests]))
 
@@ -6,10 +6,15 @@ def is_friendly_pair(num1, num2):
     if not type(num1) == int or not type(num2) == int or num1 < 1 or num2 < 1 or num1 == num2:
         return "Invalid"
 
+    # Divisors come in pairs x and n // x, so it is enough to search up to
+    # the square root of n (counting it only once if n is a square)
+    def sum_of_divisors(n):
+        return sum(x + n // x if x * x != n else x for x in range(1, int(n ** 0.5) + 1) if n % x == 0)
+
     # Find divisors of num1, calculate their sum and set it to teta1
-    teta1 = sum([x for x in range(1,num1+1) if num1%x==0])
+    teta1 = sum_of_divisors(num1)
     # Find dividers of num2, calculate their sum and set it to teta2
-    teta2 = sum([x for x in range(1,num2+1) if num2%x==0])
+    teta2 = sum_of_divisors(num2)
 
     # Calculate abundancy of number 1 by dividing teta1 by number 1
     abundancy1 = teta1 / num1
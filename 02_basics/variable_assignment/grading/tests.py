@@ -1,9 +1,9 @@
 #!/usr/bin/env python3
 
 # Boilerplate necessary to set up ACCESS test
-import sys
-try: from universal.harness import *
-except: sys.path.append("../../universal/"); from harness import *
+import os, sys
+sys.path.append("universal" if os.path.isdir("universal") else "../../universal")
+from harness import *
 
 # Grading test suite starts here
 import inspect
@@ -6,13 +6,9 @@ from grading.tests_2b_electric_car import TestElectricCar
 from grading.tests_2c_hybrid_car import TestHybridCar
 
 
-import sys
-
-try:
-    from universal.harness import *
-except:
-    sys.path.append("../../universal/")
-    from harness import *
+import os, sys
+sys.path.append("universal" if os.path.isdir("universal") else "../../universal")
+from harness import *
 
 TestRunner().run(
     AccessTestSuite(
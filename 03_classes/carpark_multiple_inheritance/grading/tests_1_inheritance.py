@@ -1,14 +1,11 @@
 #!/usr/bin/env python3
 
-import sys
 import ast
 from abc import ABC
 
-try:
-    from universal.harness import *
-except:
-    sys.path.append("../../universal/")
-    from harness import *
+import os, sys
+sys.path.append("universal" if os.path.isdir("universal") else "../../universal")
+from harness import *
 
 car_implementation = grading_import("task", "car")
 combustion_car_implementation = grading_import("task", "combustion_car")
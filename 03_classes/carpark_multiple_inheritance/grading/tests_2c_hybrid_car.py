@@ -1,12 +1,8 @@
 #!/usr/bin/env python3
 
-import sys
-
-try:
-    from universal.harness import *
-except:
-    sys.path.append("../../universal/")
-    from harness import *
+import os, sys
+sys.path.append("universal" if os.path.isdir("universal") else "../../universal")
+from harness import *
 
 implementation = grading_import("task", "hybrid_car")
 
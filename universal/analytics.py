@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Find common misconceptions in the grading results of many submissions.
+
+    python universal/analytics.py [-j <jobs>] [-n <clusters>] [--task <slug>] [-o <report.json>] <path> ...
+
+Every path is a directory or a .zip/.tar(.gz) archive, e.g. the output of
+batch.py, containing a `grade_results.jsonl` per submission (the log the
+harness writes next to `grade_results.json`). Submissions are clustered by
+the set of tests they fail, a bitset over the `test_names` of the log, and by
+the types of the errors raised in those tests. The most common clusters of
+failing submissions are reported per task, with their failing tests, error
+types, first hint and a few example submissions. A submission with only a
+`grade_results.json` is counted too; its failing tests are unknown, so all
+such failing submissions of a task form one cluster.
+
+The results are streamed: worker processes (one per core by default) parse
+the logs in chunks and only send the signatures back, and at most `capacity`
+clusters are kept per task. Whenever a task has more, the less common half is
+dropped, so the counts of rare clusters may be too low, but the common ones,
+which the report is about, are counted correctly.
+"""
+import argparse
+import heapq
+import json
+import multiprocessing
+import os
+import sys
+import tarfile
+import zipfile
+from collections import deque
+
+from batch import LOG_FILE, RESULTS_FILE, SUMMARY_FILE
+from store import find_task
+
+CHUNK_SIZE = 200
+CAPACITY = 10000
+EXAMPLES = 3
+
+def parse(name, log, results=None, task=None):
+    """(task, test_names, failing bitset, error types, first hint, name) of a
+    submission from the contents of its grade_results.jsonl and, if
+    available, grade_results.json. Without a log, only whether the
+    submission failed is known: it has no test names and failing is 1."""
+    if log is None:
+        hint = next((h for h in json.loads(results).get("hints", []) if h is not None), None)
+        return task or "unknown", (), 0 if hint is None else 1, (), hint, name
+    lines = log.splitlines()
+    header = json.loads(lines[0])
+    test_names = tuple(header["test_names"])
+    index = {test_name: i for i, test_name in enumerate(test_names)}
+    # Tests that never finished count as failed, like in finalize_grade_results
+    failing = (1 << len(test_names)) - 1
+    errors = set()
+    hints = {}
+    for line in lines[1:]:
+        try:
+            entry = json.loads(line)
+        except ValueError: # cut off when grading was killed
+            continue
+        i = index.get(entry["test_name"])
+        if i is None:
+            continue
+        if entry["success"]:
+            failing &= ~(1 << i)
+        elif entry.get("error_type"):
+            errors.add(entry["error_type"])
+        hints[i] = entry["hint"]
+    if results is not None:
+        hint = next((h for h in json.loads(results).get("hints", []) if h is not None), None)
+    else:
+        hint = next((hints.get(i) for i in range(len(test_names)) if failing >> i & 1), None)
+    return header.get("task") or task or "unknown", test_names, failing, tuple(sorted(errors)), hint, name
+
+def parse_chunk(chunk):
+    """Entry point of the workers: parse the submissions of a chunk, which
+    are (archive, [(name, log member, results member, task)]) for a zip
+    archive or (None, [(name, log path, results path, task)])"""
+    archive, submissions = chunk
+    records = []
+    test_names = {} # share one tuple per task, so it is pickled once
+    def add(record):
+        records.append((record[0], test_names.setdefault(record[1], record[1])) + record[2:])
+    if archive is None:
+        for name, log_path, results_path, task in submissions:
+            try:
+                log = None
+                if os.path.isfile(log_path):
+                    with open(log_path, "rb") as f:
+                        log = f.read()
+                results = None
+                if os.path.isfile(results_path):
+                    with open(results_path, "rb") as f:
+                        results = f.read()
+                add(parse(name, log, results, task))
+            except (OSError, ValueError, KeyError):
+                continue
+    else:
+        with zipfile.ZipFile(archive) as z:
+            members = set(z.namelist())
+            for name, log_member, results_member, task in submissions:
+                try:
+                    results = z.read(results_member) if results_member in members else None
+                    log = z.read(log_member) if log_member in members else None
+                    add(parse(name, log, results, task))
+                except (ValueError, KeyError):
+                    continue
+    return records
+
+def parse_records(chunk):
+    """Entry point of the workers for submissions read from a tar archive by the parent"""
+    records = []
+    for name, log, results, task in chunk:
+        try:
+            records.append(parse(name, log, results, task))
+        except (ValueError, KeyError):
+            continue
+    return records
+
+def read_summary(contents):
+    try:
+        return json.loads(contents).get("task")
+    except (ValueError, AttributeError):
+        return None
+
+def closest_task(directory, tasks):
+    """The task of the closest summary.json of batch.py above a directory of an
+    archive, like find_task does for directories; tasks is a map of
+    directory: task of the summary.json files in the archive"""
+    directory = os.path.normpath(directory)
+    while True:
+        if directory in tasks:
+            return tasks[directory]
+        if directory in (".", os.sep):
+            return None
+        directory = os.path.dirname(directory) or "."
+
+def tar_tasks(path):
+    """Map of directory: task of the summary.json files in a tar archive.
+    batch.py writes the summary last, so this reads the archive once more."""
+    tasks = {}
+    with tarfile.open(path, "r|*") as tar:
+        for member in tar:
+            if member.isfile() and os.path.basename(member.name) == SUMMARY_FILE:
+                tasks[os.path.normpath(os.path.dirname(member.name))] = read_summary(tar.extractfile(member).read())
+    return tasks
+
+def chunks(paths, task=None, size=CHUNK_SIZE):
+    """(function, chunk) work items for the workers, produced lazily"""
+    for path in paths:
+        if os.path.isdir(path):
+            chunk = []
+            for directory, _, names in os.walk(path):
+                if LOG_FILE not in names and RESULTS_FILE not in names:
+                    continue
+                chunk.append((os.path.relpath(directory, path), os.path.join(directory, LOG_FILE),
+                              os.path.join(directory, RESULTS_FILE), task or find_task(directory, path)))
+                if len(chunk) == size:
+                    yield parse_chunk, (None, chunk)
+                    chunk = []
+            if chunk:
+                yield parse_chunk, (None, chunk)
+        elif zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as z:
+                names = z.namelist()
+                directories = sorted({os.path.dirname(name) for name in names
+                                      if os.path.basename(name) in (LOG_FILE, RESULTS_FILE)})
+                tasks = {} if task else {os.path.normpath(os.path.dirname(name)): read_summary(z.read(name))
+                                         for name in names if os.path.basename(name) == SUMMARY_FILE}
+            for start in range(0, len(directories), size):
+                yield parse_chunk, (path, [(directory, os.path.join(directory, LOG_FILE),
+                                            os.path.join(directory, RESULTS_FILE), task or closest_task(directory, tasks))
+                                           for directory in directories[start:start + size]])
+        else:
+            # Tar archives can only be read in order, so the parent reads
+            # them and sends the contents to the workers
+            yield from tar_chunks(path, task, size)
+
+def tar_chunks(path, task, size):
+    tasks = {} if task else tar_tasks(path)
+    pending = {} # Map of directory: {file name: contents} of the submission being read
+    chunk = []
+    with tarfile.open(path, "r|*") as tar:
+        for member in tar:
+            name = os.path.basename(member.name)
+            if not member.isfile() or name not in (LOG_FILE, RESULTS_FILE):
+                continue
+            directory = os.path.normpath(os.path.dirname(member.name))
+            # Archives list the files of a directory together, so once another
+            # directory starts, the earlier submission is complete, even if it
+            # lacks one of the files. This keeps memory bounded.
+            for other in [d for d in pending if d != directory]:
+                files = pending.pop(other)
+                chunk.append((other, files.get(LOG_FILE), files.get(RESULTS_FILE), task or closest_task(other, tasks)))
+            files = pending.setdefault(directory, {})
+            files[name] = tar.extractfile(member).read()
+            if len(files) == 2:
+                del pending[directory]
+                chunk.append((directory, files[LOG_FILE], files[RESULTS_FILE], task or closest_task(directory, tasks)))
+            if len(chunk) >= size:
+                yield parse_records, chunk
+                chunk = []
+    chunk.extend((directory, files.get(LOG_FILE), files.get(RESULTS_FILE), task or closest_task(directory, tasks))
+                 for directory, files in pending.items())
+    if chunk:
+        yield parse_records, chunk
+
+class Clusters:
+    """Submissions of one task by failing tests and error types, keeping at
+    most `capacity` clusters"""
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self.clusters = {} # Map of (test_names, failing, errors): [count, first hint, examples]
+        self.submissions = 0
+        self.passing = 0
+
+    def add(self, test_names, failing, errors, hint, name):
+        self.submissions += 1
+        if not failing:
+            self.passing += 1
+            return
+        key = (test_names, failing, errors)
+        cluster = self.clusters.get(key)
+        if cluster is None:
+            if len(self.clusters) >= self.capacity:
+                self.prune()
+            cluster = self.clusters[key] = [0, hint, []]
+        cluster[0] += 1
+        if len(cluster[2]) < EXAMPLES:
+            cluster[2].append(name)
+
+    def prune(self):
+        keep = heapq.nlargest(self.capacity // 2, self.clusters.items(), key=lambda item: item[1][0])
+        self.clusters = dict(keep)
+
+    def top(self, n):
+        return heapq.nlargest(n, self.clusters.items(), key=lambda item: item[1][0])
+
+def analyze(paths, task=None, jobs=None, capacity=CAPACITY):
+    """{task: Clusters} of all submissions below the paths"""
+    jobs = jobs or os.cpu_count() or 1
+    by_task = {}
+    def collect(records):
+        for record in records:
+            clusters = by_task.get(record[0])
+            if clusters is None:
+                clusters = by_task[record[0]] = Clusters(capacity)
+            clusters.add(*record[1:])
+    with multiprocessing.Pool(jobs) as pool:
+        # Bound the chunks in flight, so memory does not grow with the input
+        pending = deque()
+        for function, chunk in chunks(paths, task):
+            pending.append(pool.apply_async(function, (chunk,)))
+            while len(pending) >= 2 * jobs or (pending and pending[0].ready()):
+                collect(pending.popleft().get())
+        while pending:
+            collect(pending.popleft().get())
+    return by_task
+
+def report(by_task, n=10):
+    return {task: {"submissions": clusters.submissions,
+                   "passing": clusters.passing,
+                   "clusters": [{"count": count,
+                                 "failing_tests": [name for i, name in enumerate(test_names) if failing >> i & 1],
+                                 "error_types": list(errors),
+                                 "hint": hint,
+                                 "examples": examples}
+                                for (test_names, failing, errors), (count, hint, examples) in clusters.top(n)]}
+            for task, clusters in sorted(by_task.items())}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cluster failing submissions by failing tests and error types.")
+    parser.add_argument("paths", nargs="+", help="directories or .zip/.tar archives with grading results")
+    parser.add_argument("-j", "--jobs", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("-n", type=int, default=10, help="clusters reported per task (default: 10)")
+    parser.add_argument("--task", help="task slug of results whose log does not name it")
+    parser.add_argument("--capacity", type=int, default=CAPACITY, help=f"clusters kept per task (default: {CAPACITY})")
+    parser.add_argument("-o", "--output", help="also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    result = report(analyze(args.paths, args.task, args.jobs, args.capacity), args.n)
+    for task, summary in result.items():
+        failing = summary["submissions"] - summary["passing"]
+        print(f"{task}: {summary['submissions']} submissions, {failing} failing")
+        for cluster in summary["clusters"]:
+            tests = ", ".join(cluster["failing_tests"][:5]) + (", ..." if len(cluster["failing_tests"]) > 5 else "")
+            tests = tests or "(no log)"
+            errors = f" [{', '.join(cluster['error_types'])}]" if cluster["error_types"] else ""
+            print(f"  {cluster['count']:>7} {cluster['count'] / failing:>6.1%}  fails {tests}{errors}")
+            print(f"          {cluster['hint']}")
+            print(f"          e.g. {', '.join(cluster['examples'])}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Grade many submissions of the same task in one warm process.
+
+    python universal/batch.py <task_dir> <submissions_dir> [-o <output_dir>] [-j <jobs>]
+
+Every directory inside <submissions_dir> is treated as a copy of the task's
+`task/` folder. The harness and the modules used by the grading tests are
+imported once, then every submission is graded in a child process forked
+from this warm parent, so it pays neither the interpreter start nor the
+harness import. Each child runs the `grade_command` exactly like ACCESS
+would, in a private copy of the task, and its `grade_results.json` is
+collected into <output_dir>/<submission>/, next to a `summary.json`.
+"""
+import argparse
+import ast
+import json
+import multiprocessing
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import tomllib
+from multiprocessing.connection import wait
+
+UNIVERSAL = os.path.dirname(os.path.abspath(__file__))
+COURSE_ROOT = os.path.dirname(UNIVERSAL)
+if UNIVERSAL not in sys.path:
+    sys.path.insert(0, UNIVERSAL)
+
+# Imported here, under the name the grading modules use, so that every forked
+# child finds the harness in sys.modules
+import harness
+from cache import ResultCache, grading_key
+
+RESULTS_FILE = harness.GRADE_RESULTS
+LOG_FILE = harness.GRADE_LOG
+OUTPUT_FILE = "grade_output.log"
+SUMMARY_FILE = "summary.json"
+LOCAL_MODULES = ("task", "grading", "universal", "harness")
+
+def read_toml(path):
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+def course_tasks(course_root=COURSE_ROOT):
+    """Task directories in the order of the course and assignment configs"""
+    course_config = read_toml(os.path.join(course_root, "config.toml"))
+    for assignment in course_config.get("assignments", []):
+        assignment_config = read_toml(os.path.join(course_root, assignment, "config.toml"))
+        for task in assignment_config.get("tasks", []):
+            yield os.path.join(course_root, assignment, task)
+
+def copy_into(src, dst):
+    """Copy a file or a directory tree, merging into existing directories"""
+    if os.path.isdir(src):
+        shutil.copytree(src, dst, dirs_exist_ok=True)
+    else:
+        os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+        shutil.copy2(src, dst)
+
+class BatchGrader:
+
+    def __init__(self, task_dir, course_root=COURSE_ROOT, cache=None):
+        self.task_dir = os.path.abspath(task_dir)
+        self.course_root = os.path.abspath(course_root)
+        self.cache = cache
+        self.config = read_toml(os.path.join(self.task_dir, "config.toml"))
+        course_config = read_toml(os.path.join(self.course_root, "config.toml"))
+        self.global_files = course_config.get("global_files", {}).get("grading", [])
+        self.files = self.config.get("files", {})
+        self.grade_command = self.config["evaluator"]["grade_command"]
+        self.grade_module = self.parse_grade_module(self.grade_command)
+        self.preload()
+
+    @staticmethod
+    def parse_grade_module(command):
+        """Return X for a grade_command of the form 'python -m X', else None"""
+        argv = shlex.split(command)
+        if len(argv) == 3 and os.path.basename(argv[0]).startswith("python") and argv[1] == "-m":
+            return argv[2]
+        return None
+
+    def preload(self):
+        """Import the third-party and standard library modules that the
+        grading tests use. The grading modules themselves cannot be imported
+        ahead of time, because they import the submission and run the suite
+        at module level."""
+        for path in self.files.get("grading", []):
+            if not path.endswith(".py"):
+                continue
+            try:
+                with open(os.path.join(self.task_dir, path)) as f:
+                    tree = ast.parse(f.read())
+            except (OSError, SyntaxError):
+                continue
+            for node in ast.walk(tree):
+                if isinstance(node, ast.Import):
+                    names = [alias.name for alias in node.names]
+                elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                    names = [node.module]
+                else:
+                    continue
+                for name in names:
+                    if name.split(".")[0] in LOCAL_MODULES:
+                        continue
+                    try:
+                        __import__(name)
+                    except Exception:
+                        pass
+
+    def prepare_workspace(self, submission):
+        """Lay out the files like ACCESS does: visible and grading files of
+        the task, global grading files of the course, and the submission
+        copied over `task/`."""
+        workspace = tempfile.mkdtemp(prefix="access-batch-")
+        for path in self.files.get("visible", []) + self.files.get("grading", []):
+            src = os.path.join(self.task_dir, path)
+            if os.path.exists(src):
+                copy_into(src, os.path.join(workspace, path))
+        for path in self.global_files:
+            src = os.path.join(self.course_root, path)
+            if os.path.exists(src):
+                copy_into(src, os.path.join(workspace, path))
+        copy_into(submission, os.path.join(workspace, "task"))
+        return workspace
+
+    def cached(self, submission, output_dir):
+        """The cached results of a submission, written to its output directory"""
+        key = grading_key(self.task_dir, submission, self.course_root)
+        content = self.cache.get(key)
+        if content is None:
+            return key, None
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, RESULTS_FILE), "wb") as f:
+            f.write(content)
+        return key, {"exitcode": 0, "cached": True, **json.loads(content)}
+
+    def start(self, submission, output_dir):
+        """Start grading a submission; returns the child process"""
+        workspace = self.prepare_workspace(submission)
+        os.makedirs(output_dir, exist_ok=True)
+        log_path = os.path.join(output_dir, OUTPUT_FILE)
+        if self.grade_module is not None and "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+            target, args = run_grade_module, (workspace, self.grade_module, log_path)
+        else:
+            context = multiprocessing.get_context()
+            target, args = run_grade_command, (workspace, self.grade_command, log_path)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        process = context.Process(target=target, args=args)
+        process.start()
+        process.workspace = workspace
+        process.output_dir = output_dir
+        return process
+
+    def finish(self, process):
+        """Collect the results of a finished child and clean up"""
+        src = os.path.join(process.workspace, RESULTS_FILE)
+        dst = os.path.join(process.output_dir, RESULTS_FILE)
+        log = os.path.join(process.workspace, LOG_FILE)
+        result = {"exitcode": process.exitcode}
+        if os.path.isfile(log):
+            shutil.copyfile(log, os.path.join(process.output_dir, LOG_FILE))
+            if not os.path.isfile(src):
+                # The child died before writing its results, salvage what it logged
+                harness.finalize_grade_results(log, src)
+                result["salvaged"] = True
+        if os.path.isfile(src):
+            shutil.copyfile(src, dst)
+            with open(dst, "rb") as f:
+                content = f.read()
+            result.update(json.loads(content))
+            if self.cache is not None and process.exitcode == 0 and not result.get("salvaged"):
+                self.cache.put(process.cache_key, content)
+        elif os.path.exists(dst):
+            os.remove(dst)
+        shutil.rmtree(process.workspace, ignore_errors=True)
+        return result
+
+    def grade_all(self, submissions, output_dir, jobs=None):
+        """Grade (name, path) submissions with up to `jobs` children at once
+        and return the summary"""
+        jobs = jobs or os.cpu_count() or 1
+        pending = list(submissions)
+        running = {}
+        results = {}
+        while pending or running:
+            while pending and len(running) < jobs:
+                name, path = pending.pop(0)
+                if self.cache is not None:
+                    key, cached = self.cached(path, os.path.join(output_dir, name))
+                    if cached is not None:
+                        results[name] = cached
+                        continue
+                process = self.start(path, os.path.join(output_dir, name))
+                if self.cache is not None:
+                    process.cache_key = key
+                running[process.sentinel] = (name, process)
+            if not running:
+                continue
+            for sentinel in wait(list(running)):
+                name, process = running.pop(sentinel)
+                process.join()
+                results[name] = self.finish(process)
+        return self.summarize(results, output_dir)
+
+    def summarize(self, results, output_dir):
+        graded = {name: r for name, r in results.items() if "points" in r}
+        summary = {
+            "task": self.config.get("slug"),
+            "max_points": self.config.get("max_points"),
+            "submissions": len(results),
+            "graded": len(graded),
+            "cached": sum(1 for r in results.values() if r.get("cached")),
+            "failed": sorted(name for name in results if name not in graded),
+            "mean_points": (sum(r["points"] for r in graded.values()) / len(graded)) if graded else None,
+            "results": {name: {"points": r.get("points"),
+                               "hint": next((h for h in r.get("hints", []) if h is not None), None),
+                               "exitcode": r["exitcode"]}
+                        for name, r in sorted(results.items())},
+        }
+        with open(os.path.join(output_dir, SUMMARY_FILE), "w") as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+def run_grade_module(workspace, module, log_path):
+    """Entry point of a forked child: behave like `python -m <module>` in the workspace"""
+    import runpy
+    # The parent's timestamps would make the phases of this run wrong
+    harness.reset_timestamps()
+    log = open(log_path, "w")
+    os.dup2(log.fileno(), 1)
+    os.dup2(log.fileno(), 2)
+    os.chdir(workspace)
+    sys.path.insert(0, workspace)
+    sys.argv = [module]
+    try:
+        runpy.run_module(module, run_name="__main__", alter_sys=True)
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+def run_grade_command(workspace, command, log_path):
+    """Fallback for platforms without fork and for grade commands that are
+    not a plain `python -m` invocation"""
+    with open(log_path, "w") as log:
+        code = subprocess.call(command, cwd=workspace, shell=True,
+                               stdout=log, stderr=subprocess.STDOUT)
+    sys.exit(code)
+
+def find_submissions(submissions_dir):
+    return [(name, os.path.join(submissions_dir, name))
+            for name in sorted(os.listdir(submissions_dir))
+            if os.path.isdir(os.path.join(submissions_dir, name))]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grade many submissions of one task in a warm process.")
+    parser.add_argument("task_dir", help="task directory containing config.toml and grading/")
+    parser.add_argument("submissions_dir", help="directory with one copy of task/ per submission")
+    parser.add_argument("-o", "--output", help="output directory (default: <submissions_dir>)")
+    parser.add_argument("-j", "--jobs", type=int, help="number of submissions graded at once (default: CPU count)")
+    parser.add_argument("--cache", metavar="DIR", help="reuse results of identical submissions stored in this cache directory")
+    args = parser.parse_args(argv)
+
+    grader = BatchGrader(args.task_dir, cache=ResultCache(args.cache) if args.cache else None)
+    output_dir = os.path.abspath(args.output or args.submissions_dir)
+    summary = grader.grade_all(find_submissions(args.submissions_dir), output_dir, args.jobs)
+    print(f"Graded {summary['graded']}/{summary['submissions']} submissions of '{summary['task']}'", file=sys.stderr)
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark of the grade command of every task in the course.
+
+    python universal/benchmark.py [-n <repeats>] [-o <results.json>]
+                                  [--baseline <baseline.json>] [--threshold <fraction>] [<task_dir> ...]
+
+Each task is laid out in a private copy like ACCESS does (see batch.py), once
+with the untouched template in `task/` and once with `solution/` copied over
+it, then its `grade_command` is run `repeats` times for each, every time in a
+new interpreter without bytecode caches, just like in the fresh container
+that grades a submission.
+
+The runs report their timings (ACCESS_METRICS=time), so the wall time of a
+run is split up into its phases:
+
+    startup         starting the interpreter and the grading module, up to the harness import
+    harness         importing the harness
+    grading_import  importing the submission, summed over all grading_import calls
+    tests           running the test suite
+    write           writing grade_results.json
+    total           the whole grade command, including the interpreter shutdown
+
+For every phase the 50th and 90th percentile and the maximum over the runs are
+reported. The results written with -o can be passed as --baseline to a later
+run, which then fails if the median total time of a task got slower than in
+the baseline by more than the threshold.
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from batch import COURSE_ROOT, RESULTS_FILE, BatchGrader, course_tasks
+import harness
+
+PHASES = ("startup", "harness", "grading_import", "tests", "write", "total")
+SUBMISSIONS = ("template", "solution")
+# Differences below this many seconds are noise, whatever the threshold
+MIN_REGRESSION = 0.005
+
+def cold_env():
+    env = dict(os.environ)
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    env["ACCESS_METRICS"] = "time"
+    return env
+
+def time_command(command, cwd, env):
+    """Wall clock time at which a shell command was started and its wall time"""
+    started = time.time()
+    start = time.perf_counter()
+    subprocess.run(command, cwd=cwd, env=env, shell=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return started, time.perf_counter() - start
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list"""
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+def summarize(values):
+    if not values:
+        return None
+    return {"p50": percentile(values, 50), "p90": percentile(values, 90), "max": max(values)}
+
+def phases(started, total, report):
+    """Split the time of a run into its phases, using the timestamps of its metrics report"""
+    stamps = report["timestamps"]
+    return {
+        "startup": stamps["harness_import_started"] - started,
+        "harness": stamps["harness_imported"] - stamps["harness_import_started"],
+        "grading_import": report["import_time"],
+        "tests": stamps["tests_finished"] - stamps["tests_started"],
+        "write": stamps["results_written"] - stamps["tests_finished"],
+        "total": total,
+    }
+
+def benchmark_submission(grader, submission, repeats):
+    workspace = grader.prepare_workspace(submission)
+    env = cold_env()
+    results = os.path.join(workspace, RESULTS_FILE)
+    metrics = os.path.join(workspace, harness.GRADE_METRICS)
+    timings = {phase: [] for phase in PHASES}
+    failures = 0
+    try:
+        for _ in range(repeats):
+            for path in (results, metrics):
+                if os.path.exists(path):
+                    os.remove(path)
+            started, total = time_command(grader.grade_command, workspace, env)
+            try:
+                with open(metrics) as f:
+                    report = json.load(f)
+                run = phases(started, total, report)
+            except (OSError, ValueError, KeyError):
+                run = None
+            if run is None or not os.path.isfile(results):
+                failures += 1
+                timings["total"].append(total)
+                continue
+            for phase, value in run.items():
+                timings[phase].append(value)
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+    return {"phases": {phase: summarize(values) for phase, values in timings.items()},
+            "failures": failures}
+
+def benchmark_task(task_dir, repeats):
+    grader = BatchGrader(task_dir)
+    return {submission: benchmark_submission(grader, os.path.join(grader.task_dir, folder), repeats)
+            for submission, folder in zip(SUBMISSIONS, ("task", "solution"))}
+
+def regressions(results, baseline, threshold):
+    """(task, submission, baseline, current) for every median total time that
+    is slower than in the baseline by more than the threshold"""
+    slower = []
+    for task, submissions in results["tasks"].items():
+        for submission, result in submissions.items():
+            try:
+                before = baseline["tasks"][task][submission]["phases"]["total"]["p50"]
+            except (KeyError, TypeError):
+                continue
+            now = result["phases"]["total"]["p50"]
+            if now > before * (1 + threshold) and now - before > MIN_REGRESSION:
+                slower.append((task, submission, before, now))
+    return slower
+
+def ms(summary, key="p50"):
+    return f"{summary[key] * 1000:>7.1f}" if summary else f"{'n/a':>7}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the cold-start time of the grade command of every task.")
+    parser.add_argument("tasks", nargs="*", help="task directories (default: all tasks of the course)")
+    parser.add_argument("-n", "--repeats", type=int, default=5, help="runs per task and submission (default: 5)")
+    parser.add_argument("-o", "--output", help="write the results to this JSON file, e.g. to use it as a baseline")
+    parser.add_argument("--baseline", help="fail if a task got slower than in these results of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed slowdown against the baseline, as a fraction (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    interpreter = summarize([time_command(f'"{sys.executable}" -c pass', COURSE_ROOT, cold_env())[1]
+                             for _ in range(args.repeats)])
+    results = {"repeats": args.repeats, "interpreter": interpreter, "tasks": {}}
+    print(f"{'task':<45} {'':<9}" + "".join(f"{phase:>15}" for phase in PHASES))
+    print(f"{'(interpreter start)':<55}{ms(interpreter)}ms p50{ms(interpreter, 'p90')}ms p90")
+    failed = False
+    for task_dir in args.tasks or course_tasks():
+        task = os.path.relpath(os.path.abspath(task_dir), COURSE_ROOT)
+        results["tasks"][task] = benchmark_task(task_dir, args.repeats)
+        for submission, result in results["tasks"][task].items():
+            line = f"{task:<45} {submission:<9}" + "".join(
+                f"{ms(result['phases'][phase])}/{ms(result['phases'][phase], 'p90').strip():<7}"
+                for phase in PHASES)
+            if result["failures"]:
+                failed = True
+                line += f"  ({result['failures']} runs wrote no results)"
+            print(line)
+    print("(p50/p90 in milliseconds)")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for task, submission, before, now in regressions(results, baseline, args.threshold):
+            failed = True
+            print(f"REGRESSION: {task} ({submission}) takes {now * 1000:.1f}ms, "
+                  f"{(now / before - 1) * 100:.0f}% more than the baseline's {before * 1000:.1f}ms")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
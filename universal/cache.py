@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of grading results.
+
+    python universal/cache.py [--cache-dir <dir>] [--max-size <MB>] [-- <grade_command>]
+
+Run in a task directory instead of the `grade_command`. The cache key is a
+hash of the submission's editable files, the task's grading files and
+config.toml, and the course's global grading files (i.e. the harness), so
+resubmitting unchanged files returns the stored `grade_results.json` without
+running anything, and changing the grading tests or the harness invalidates
+all entries of a task. Entries are evicted least-recently-used first once the
+cache grows beyond its maximum size. Writes are atomic, so concurrent graders
+can share one cache directory.
+"""
+import argparse
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+import tomllib
+
+COURSE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_DIR = os.environ.get("ACCESS_GRADE_CACHE",
+                                   os.path.join(os.path.expanduser("~"), ".cache", "access-grading"))
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+RESULTS_FILE = "grade_results.json"
+# Bump to invalidate every entry, e.g. when the key computation changes
+KEY_VERSION = b"access-grade-cache-1"
+
+def read_toml(path):
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+def hash_file(digest, label, path):
+    """Feed a labelled file into the digest; missing files hash differently than empty ones"""
+    digest.update(label.encode() + b"\0")
+    try:
+        with open(path, "rb") as f:
+            content = f.read()
+    except OSError:
+        digest.update(b"missing\0")
+        return
+    digest.update(b"%d\0" % len(content))
+    digest.update(content)
+
+def grading_key(task_dir, submission_dir=None, course_root=COURSE_ROOT):
+    """Hash of everything that determines the grading result of a submission.
+    `submission_dir` is a copy of the task's `task/` folder; if omitted, the
+    editable files are read from `task_dir` itself."""
+    config = read_toml(os.path.join(task_dir, "config.toml"))
+    files = config.get("files", {})
+    digest = hashlib.sha256(KEY_VERSION)
+    for path in sorted(files.get("editable", [])):
+        if submission_dir is not None and path.startswith("task/"):
+            source = os.path.join(submission_dir, path[len("task/"):])
+        else:
+            source = os.path.join(task_dir, path)
+        hash_file(digest, "editable:" + path, source)
+    for path in sorted(files.get("grading", [])):
+        hash_file(digest, "grading:" + path, os.path.join(task_dir, path))
+    hash_file(digest, "config", os.path.join(task_dir, "config.toml"))
+    for path in global_files(course_root):
+        hash_file(digest, "global:" + path, os.path.join(course_root, path))
+    return digest.hexdigest()
+
+def global_files(course_root):
+    """The course's global grading files. Inside a grading container, where
+    the config.toml found there is the task's own (or none at all), all of
+    universal/ is used."""
+    try:
+        course_config = read_toml(os.path.join(course_root, "config.toml"))
+        grading = course_config.get("global_files", {}).get("grading")
+        if grading is not None:
+            return sorted(grading)
+    except (OSError, ValueError):
+        pass
+    universal = os.path.join(course_root, "universal")
+    try:
+        names = os.listdir(universal)
+    except OSError:
+        return []
+    return sorted(os.path.join("universal", name) for name in names if name.endswith(".py"))
+
+class ResultCache:
+    """On-disk store of grade_results.json contents, keyed by grading_key"""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key):
+        """The cached results as bytes, or None"""
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            # The modification time doubles as the last use for LRU eviction
+            os.utime(path)
+        except OSError:
+            return None
+        return content
+
+    def put(self, key, content):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.evict()
+
+    def entries(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError: # evicted concurrently
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits its maximum size"""
+        entries = sorted(self.entries())
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in entries:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= entry_size
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the grade command unless the results are already cached.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="cache directory (default: $ACCESS_GRADE_CACHE or ~/.cache/access-grading)")
+    parser.add_argument("--max-size", type=float, default=DEFAULT_MAX_SIZE / 1024 / 1024, help="maximum cache size in MB")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="grade command (default: grade_command of config.toml)")
+    args = parser.parse_args(argv)
+
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    command = " ".join(command) or read_toml("config.toml")["evaluator"]["grade_command"]
+    cache = ResultCache(args.cache_dir, int(args.max_size * 1024 * 1024))
+    key = grading_key(os.getcwd())
+
+    cached = cache.get(key)
+    if cached is not None:
+        with open(RESULTS_FILE, "wb") as f:
+            f.write(cached)
+        print(f"Using cached grading results {key}", file=sys.stderr)
+        return 0
+
+    if os.path.exists(RESULTS_FILE):
+        os.remove(RESULTS_FILE)
+    code = subprocess.call(command, shell=True)
+    if code == 0 and os.path.isfile(RESULTS_FILE):
+        with open(RESULTS_FILE, "rb") as f:
+            cache.put(key, f.read())
+    return code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Precompute the results of the sample solution for the grading tests.
+
+    python universal/expected.py [--check] [<task_dir> ...]
+
+For every task (default: all tasks of the course) that declares inputs in
+`grading/expected_inputs.py`, runs the functions of `solution/` on them once
+and stores the results in `grading/expected.dat`, which the grading tests read
+with `expected_value(...)` instead of hard-coding or recomputing them:
+
+    INPUTS = {
+        "script.is_friendly_pair": [(6, 28), (24, 91963648)],
+    }
+
+The keys name a function of a module in `solution/`, the values list the
+argument tuples. The results must be Python literals. Rebuild whenever the
+solution or the inputs change; with --check, nothing is written and the exit
+code tells whether every file is up to date.
+"""
+import argparse
+import ast
+import importlib.util
+import json
+import os
+import runpy
+import struct
+import sys
+
+from batch import course_tasks, read_toml
+import harness
+
+INPUTS_FILE = "grading/expected_inputs.py"
+
+def load_inputs(task_dir):
+    return runpy.run_path(os.path.join(task_dir, INPUTS_FILE))["INPUTS"]
+
+def solution_files(inputs):
+    return sorted({f"{harness.SOLUTION_DIR}/{function.rsplit('.', 1)[0].replace('.', '/')}.py"
+                   for function in inputs})
+
+def compute(task_dir, inputs):
+    """(key, value) records of the solution's results for all inputs"""
+    modules = {}
+    records = {}
+    # Solutions import their siblings from the task package, like submissions do
+    sys.path.insert(0, task_dir)
+    cwd = os.getcwd()
+    os.chdir(task_dir)
+    try:
+        for function, arg_tuples in inputs.items():
+            module, name = function.rsplit(".", 1)
+            if module not in modules:
+                path = f"{harness.SOLUTION_DIR}/{module.replace('.', '/')}.py"
+                spec = importlib.util.spec_from_file_location("_expected_" + module.replace(".", "_"), path)
+                modules[module] = importlib.util.module_from_spec(spec)
+                with harness.CapturedOutput():
+                    spec.loader.exec_module(modules[module])
+            implementation = getattr(modules[module], name)
+            for args in arg_tuples:
+                args = tuple(args)
+                result = implementation(*args)
+                value = repr(result)
+                try:
+                    literal = ast.literal_eval(value) == result
+                except (ValueError, SyntaxError):
+                    literal = False
+                if not literal:
+                    raise ValueError(f"{function}{args!r} returns {value}, which is not a Python literal")
+                records[harness.expected_key(function, args)] = value.encode()
+    finally:
+        os.chdir(cwd)
+        sys.path.remove(task_dir)
+        for module in [m for m in sys.modules if m == "task" or m.startswith("task.")]:
+            del sys.modules[module]
+    return records
+
+def build(records, metadata):
+    """The contents of an expected values file, see harness.ExpectedValues"""
+    metadata = json.dumps(metadata, sort_keys=True).encode()
+    entries = sorted((harness.expected_key_hash(key), key) for key in records)
+    offset = struct.calcsize(harness.EXPECTED_HEADER) + len(metadata) + len(entries) * struct.calcsize(harness.EXPECTED_ENTRY)
+    index = bytearray()
+    data = bytearray()
+    for key_hash, key in entries:
+        index += struct.pack(harness.EXPECTED_ENTRY, key_hash, offset + len(data))
+        data += struct.pack(harness.EXPECTED_RECORD, len(key), len(records[key])) + key + records[key]
+    header = struct.pack(harness.EXPECTED_HEADER, harness.EXPECTED_MAGIC, harness.EXPECTED_VERSION,
+                         len(entries), len(metadata))
+    return header + metadata + bytes(index) + bytes(data)
+
+def build_task(task_dir, check=False):
+    """Build the expected values file of a task; returns whether it was up to date"""
+    inputs = load_inputs(task_dir)
+    files = solution_files(inputs)
+    cwd = os.getcwd()
+    os.chdir(task_dir)
+    try:
+        digest = harness.solution_digest(files)
+    finally:
+        os.chdir(cwd)
+    metadata = {"solution_files": files, "solution_digest": digest}
+    content = build(compute(task_dir, inputs), metadata)
+    path = os.path.join(task_dir, harness.EXPECTED_VALUES)
+    try:
+        with open(path, "rb") as f:
+            up_to_date = f.read() == content
+    except OSError:
+        up_to_date = False
+    if not check and not up_to_date:
+        with open(path, "wb") as f:
+            f.write(content)
+    grading_files = read_toml(os.path.join(task_dir, "config.toml")).get("files", {}).get("grading", [])
+    if harness.EXPECTED_VALUES not in grading_files:
+        print(f"warning: {harness.EXPECTED_VALUES} is not listed in the grading files of {task_dir}/config.toml",
+              file=sys.stderr)
+    return up_to_date
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute the results of the sample solutions.")
+    parser.add_argument("tasks", nargs="*", help="task directories (default: all tasks of the course)")
+    parser.add_argument("--check", action="store_true", help="only check that the files are up to date")
+    args = parser.parse_args(argv)
+
+    stale = []
+    for task_dir in args.tasks or course_tasks():
+        task_dir = os.path.abspath(task_dir)
+        if not os.path.isfile(os.path.join(task_dir, INPUTS_FILE)):
+            continue
+        if not build_task(task_dir, args.check):
+            stale.append(task_dir)
+            print(f"{'out of date' if args.check else 'built'}: {os.path.join(task_dir, harness.EXPECTED_VALUES)}")
+    return 1 if args.check and stale else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,23 @@
+# Keep the imports at the top minimal, grading starts in a fresh container for
+# every submission. Modules only needed for reporting or by rarely used
+# features (json, inspect, multiprocessing, ...) are imported where they are used.
+import time
+# Wall clock times at which the phases of this run started or ended, reported
+# with the metrics so that benchmark.py can split up the time of a run
+_timestamps = {"harness_import_started": time.time()}
+import ast
 import builtins
-import inspect
+import io
 from collections import defaultdict
-from dataclasses import dataclass, astuple
+from dataclasses import dataclass, asdict, field
 from unittest import TestCase, TestSuite, TextTestResult, TextTestRunner, defaultTestLoader
-import json
+import os
+import signal
 import sys
+try:
+    import resource
+except ImportError: # Not available on Windows, memory limits are ignored there
+    resource = None
 
 class GradingException(Exception): pass
 
@@ -19,75 +32,977 @@ builtins.input = crashing_input
 class MissingHintException(Exception): pass
 MISSING_HINT = "No solution hint (report this as an issue)"
 
+GRADE_RESULTS = "grade_results.json"
+# Every GradeResult is appended to this JSON lines file as soon as its test
+# finishes. If grading gets killed before grade_results.json is written,
+# finalize_grade_results can still compute points and hints from it.
+GRADE_LOG = "grade_results.jsonl"
+UNFINISHED_HINT = "Grading did not finish, so this part of your solution could not be checked. Make sure your code does not run for too long."
+# Written next to grade_results.json when metrics are enabled
+GRADE_METRICS = "grade_metrics.json"
+
+def metrics_enabled():
+    """Detailed metrics are opt-in, by setting ACCESS_METRICS=1, or
+    ACCESS_METRICS=time to leave out the (slow) memory measurements"""
+    return os.environ.get("ACCESS_METRICS", "") not in ("", "0")
+
+def memory_metrics_enabled():
+    return metrics_enabled() and os.environ["ACCESS_METRICS"] != "time"
+
+class Measurement:
+    """Wall time and CPU time of a test or an import, plus the peak memory
+    allocated by Python code if metrics are enabled (using tracemalloc,
+    which slows down the code being measured)"""
+
+    def start(self):
+        self._traced = memory_metrics_enabled()
+        if self._traced:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._memory = tracemalloc.get_traced_memory()[0]
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def stop(self):
+        metrics = {"wall_time": time.perf_counter() - self._wall,
+                   "cpu_time": time.process_time() - self._cpu}
+        if self._traced:
+            import tracemalloc
+            metrics["peak_memory"] = tracemalloc.get_traced_memory()[1] - self._memory
+        return metrics
+
+def profile_dir():
+    """Profiling is opt-in, by setting ACCESS_PROFILE=<artifacts directory>"""
+    return os.environ.get("ACCESS_PROFILE") or None
+
+class Profile:
+    """cProfile of a test or an import, plus the allocations of Python code
+    if ACCESS_PROFILE_MEMORY=1 (using tracemalloc). Writes <name>.pstats, a
+    summary <name>.txt, collapsed stacks for flame graphs <name>.folded and
+    the allocations <name>.alloc.txt to the artifacts directory. Profiles
+    do not nest, e.g. a grading_import inside a test is part of the test's."""
+    active = None
+
+    def __init__(self, name):
+        import re
+        self.path = os.path.join(profile_dir(), re.sub(r"[^\w.-]+", "_", name))
+
+    def start(self):
+        import cProfile
+        self._profiler = None
+        if Profile.active is not None:
+            return self
+        Profile.active = self
+        self._snapshot = None
+        if os.environ.get("ACCESS_PROFILE_MEMORY", "") not in ("", "0"):
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self._snapshot = tracemalloc.take_snapshot()
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+        return self
+
+    def stop(self):
+        if self._profiler is None:
+            return
+        self._profiler.disable()
+        Profile.active = None
+        import cProfile
+        import pstats
+        if self._snapshot is not None:
+            import tracemalloc
+            # Leave out the allocations of the profilers themselves
+            ignore = [tracemalloc.Filter(False, module.__file__) for module in (cProfile, pstats, tracemalloc)]
+            differences = tracemalloc.take_snapshot().filter_traces(ignore).compare_to(
+                self._snapshot.filter_traces(ignore), "lineno")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._profiler.dump_stats(self.path + ".pstats")
+        with open(self.path + ".txt", "w") as f:
+            pstats.Stats(self._profiler, stream=f).sort_stats("cumulative").print_stats(40)
+        with open(self.path + ".folded", "w") as f:
+            for stack, seconds in _collapsed_stacks(pstats.Stats(self._profiler).stats).items():
+                f.write(f"{stack} {round(seconds * 1e6)}\n")
+        if self._snapshot is not None:
+            with open(self.path + ".alloc.txt", "w") as f:
+                f.writelines(f"{difference}\n" for difference in differences[:40] if difference.size_diff > 0)
+
+def _collapsed_stacks(stats):
+    """Approximate the time spent in every call stack ("a;b;c" -> seconds)
+    from the caller/callee totals of cProfile, which does not record whole
+    stacks: the time of a function is split among its callers in proportion
+    to the time each caller spent in it"""
+    callees = defaultdict(list)
+    for function, (_, _, _, _, callers) in stats.items():
+        for caller, (_, _, _, cumulative) in callers.items():
+            callees[caller].append((function, cumulative))
+    stacks = defaultdict(float)
+
+    def label(function):
+        filename, line, name = function
+        name = f"{name} ({os.path.basename(filename)}:{line})" if line else name
+        return name.replace(";", ",")
+
+    def walk(function, path, stack, share):
+        stack = f"{stack};{label(function)}" if stack else label(function)
+        stacks[stack] += stats[function][2] * share
+        for callee, cumulative in callees[function]:
+            callee_share = cumulative * share / stats[callee][3] if stats[callee][3] else 0
+            # Skip recursion and negligible stacks, their number grows quickly
+            if callee not in path and callee_share * stats[callee][3] >= 1e-6:
+                walk(callee, path | {callee}, stack, callee_share)
+
+    for function, (_, _, _, _, callers) in stats.items():
+        if not callers:
+            walk(function, {function}, "", 1.0)
+    return {stack: seconds for stack, seconds in stacks.items() if seconds > 0}
+
+# The task's config.toml, if available
+_task_config = None
+def task_config(path="config.toml"):
+    global _task_config
+    if _task_config is None:
+        try:
+            import tomllib
+            with open(path, "rb") as f:
+                _task_config = tomllib.load(f)
+        except (ImportError, OSError, ValueError):
+            _task_config = {}
+    return _task_config
+
+def evaluator_config(path="config.toml"):
+    """The [evaluator] section of the task's config.toml"""
+    return task_config(path).get("evaluator", {})
+
+# Raised when a test or an import exceeds its budget. It is not an Exception
+# so that student code (or a grading test) catching Exception cannot hide it.
+class BudgetExceeded(BaseException):
+    def __init__(self, budget, limit):
+        super().__init__(f"{limit} exceeded")
+        self.budget = budget
+
+_active_budgets = [] # outermost first
+_TIMERS = {}
+if hasattr(signal, "setitimer"):
+    _TIMERS = {signal.ITIMER_REAL: (signal.SIGALRM, time.perf_counter),
+               signal.ITIMER_PROF: (signal.SIGPROF, time.process_time)}
+_MB = 1024 * 1024
+
+class Budget:
+    """Wall-clock time, CPU time and memory limits for a test or an import.
+
+    Limits are given in seconds and in MB of address space that may be
+    allocated on top of what the process uses when the budget starts.
+    Time limits are enforced with interval timers, so they only work in the
+    main thread on platforms that support them."""
+
+    def __init__(self, timeout=None, cpu_timeout=None, memory_limit=None):
+        self.timeout = timeout
+        self.cpu_timeout = cpu_timeout
+        self.memory_limit = memory_limit
+        self.exceeded = None
+        self._deadlines = {}
+        self._saved_memory_limit = None
+
+    @classmethod
+    def from_config(cls, prefix):
+        """Read <prefix>_timeout, <prefix>_cpu_timeout and <prefix>_memory_limit from config.toml"""
+        config = evaluator_config()
+        return cls(config.get(f"{prefix}_timeout"),
+                   config.get(f"{prefix}_cpu_timeout"),
+                   config.get(f"{prefix}_memory_limit"))
+
+    def describe(self, timer=None):
+        if timer is None:
+            return f"memory limit of {self.memory_limit} MB"
+        if timer == signal.ITIMER_REAL:
+            return f"time limit of {self.timeout} seconds"
+        return f"CPU time limit of {self.cpu_timeout} seconds"
+
+    def hint(self):
+        return f"Your code exceeded the {self.exceeded}. Make sure it terminates and does not waste time or memory."
+
+    def memory_exceeded(self):
+        self.exceeded = self.describe()
+        return BudgetExceeded(self, self.exceeded)
+
+    def start(self):
+        # _TIMERS is ordered wall-clock first, then CPU (and empty without setitimer)
+        for (timer, (_, clock)), limit in zip(_TIMERS.items(), (self.timeout, self.cpu_timeout)):
+            if limit:
+                self._deadlines[timer] = clock() + limit
+        if self._deadlines and _install_budget_handlers():
+            _active_budgets.append(self)
+            _arm_budget_timers()
+        if self.memory_limit and resource is not None:
+            self._limit_memory()
+        return self
+
+    def stop(self):
+        if self in _active_budgets:
+            _active_budgets.remove(self)
+            _arm_budget_timers()
+        if self._saved_memory_limit is not None:
+            try:
+                resource.setrlimit(resource.RLIMIT_AS, self._saved_memory_limit)
+            except (ValueError, OSError):
+                pass
+            self._saved_memory_limit = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _limit_memory(self):
+        try:
+            with open("/proc/self/statm") as f:
+                used = int(f.read().split()[0]) * resource.getpagesize()
+            soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+            limit = used + int(self.memory_limit * _MB)
+            for current in (soft, hard):
+                if current != resource.RLIM_INFINITY:
+                    limit = min(limit, current)
+            resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+            self._saved_memory_limit = (soft, hard)
+        except (OSError, ValueError, IndexError):
+            pass
+
+_handlers_installed = None
+def _install_budget_handlers():
+    global _handlers_installed
+    if _handlers_installed is None:
+        try:
+            for signum, _ in _TIMERS.values():
+                signal.signal(signum, _on_budget_signal)
+            _handlers_installed = True
+        except ValueError: # not in the main thread
+            _handlers_installed = False
+    return _handlers_installed
+
+def _arm_budget_timers():
+    for timer, (_, clock) in _TIMERS.items():
+        deadlines = [b._deadlines[timer] for b in _active_budgets if timer in b._deadlines]
+        if deadlines:
+            signal.setitimer(timer, max(min(deadlines) - clock(), 0.001))
+        else:
+            signal.setitimer(timer, 0)
+
+def _on_budget_signal(signum, frame):
+    for timer, (timer_signum, clock) in _TIMERS.items():
+        if timer_signum != signum:
+            continue
+        now = clock()
+        for budget in _active_budgets:
+            deadline = budget._deadlines.get(timer)
+            if deadline is not None and now >= deadline - 0.005:
+                del budget._deadlines[timer]
+                budget.exceeded = budget.describe(timer)
+                _arm_budget_timers()
+                raise BudgetExceeded(budget, budget.exceeded)
+    _arm_budget_timers()
+
+CAPTURE_HEAD = 64 * 1024
+CAPTURE_TAIL = 64 * 1024
+
+class CapturedOutput(io.TextIOBase):
+    """Replaces sys.stdout (or sys.stderr) while in a with block and keeps
+    only the first `head` and the last `tail` bytes of what is written, so
+    a student printing in an endless loop cannot exhaust the memory. Text
+    and binary writes (through `.buffer`) end up in the same capture.
+
+        with CapturedOutput() as output:
+            implementation = grading_import("task", "script")
+        output.getvalue()
+    """
+
+    def __init__(self, stream="stdout", head=CAPTURE_HEAD, tail=CAPTURE_TAIL):
+        self.stream = stream
+        self.total = 0 # bytes written, including the ones that were dropped
+        self.buffer = _CapturedBytes(self)
+        self._head_limit = head
+        self._tail_limit = tail
+        self._head = bytearray()
+        self._tail = bytearray()
+        self._saved = None
+
+    def __enter__(self):
+        self._saved = getattr(sys, self.stream)
+        setattr(sys, self.stream, self)
+        return self
+
+    def __exit__(self, *exc):
+        # Not closed, the captured output stays readable
+        setattr(sys, self.stream, self._saved)
+
+    @property
+    def encoding(self):
+        return "utf-8"
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        if not isinstance(s, str):
+            raise TypeError(f"write() argument must be str, not {type(s).__name__}")
+        self._write_bytes(s.encode("utf-8", "surrogateescape"))
+        return len(s)
+
+    def _write_bytes(self, data):
+        data = memoryview(data).cast("B")
+        self.total += len(data)
+        room = self._head_limit - len(self._head)
+        if room > 0:
+            self._head += data[:room]
+            data = data[room:]
+        if len(data) >= self._tail_limit:
+            self._tail[:] = data[len(data) - self._tail_limit:]
+        elif data:
+            self._tail += data
+            # bytearray deletes from the front in place, without copying the rest
+            del self._tail[:max(len(self._tail) - self._tail_limit, 0)]
+
+    @property
+    def truncated(self):
+        return self.total > len(self._head) + len(self._tail)
+
+    @property
+    def head(self):
+        """The beginning of the output"""
+        return self._head.decode("utf-8", "replace")
+
+    @property
+    def tail(self):
+        """The end of the output that did not fit into the head"""
+        return self._tail.decode("utf-8", "replace")
+
+    def getvalue(self):
+        """The whole output, or its head and tail around a marker if it was too long"""
+        if not self.truncated:
+            return (self._head + self._tail).decode("utf-8", "replace")
+        omitted = self.total - len(self._head) - len(self._tail)
+        return f"{self.head}\n[... {omitted} bytes omitted ...]\n{self.tail}"
+
+class _CapturedBytes(io.BufferedIOBase):
+    """The `.buffer` of a CapturedOutput, for code writing bytes to sys.stdout.buffer"""
+
+    def __init__(self, capture):
+        self._capture = capture
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._capture._write_bytes(data)
+        return memoryview(data).nbytes
+
+# Names that let a module define globals dynamically, which defeats the static check
+_DYNAMIC_GLOBALS = {"globals", "vars", "exec", "eval"}
+
+def _defined_names(tree):
+    """Names bound at the top level of a module, or None if that cannot be
+    determined statically. Errs on the side of finding too many names."""
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Global):
+            names.update(node.names)
+        elif isinstance(node, ast.ImportFrom) and any(a.name == "*" for a in node.names):
+            return None
+        elif isinstance(node, ast.Name) and node.id in _DYNAMIC_GLOBALS:
+            return None
+    stack = list(tree.body)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+            continue
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((a.asname or a.name).split(".")[0] for a in node.names)
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            names.add(node.id)
+        elif isinstance(node, (ast.ExceptHandler, ast.MatchAs, ast.MatchStar)) and node.name:
+            names.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest:
+            names.add(node.rest)
+        stack.extend(ast.iter_child_nodes(node))
+    return names
+
+def _source_path(module):
+    """Locate the source file of a module without importing it or any of its
+    parent packages"""
+    from importlib.machinery import PathFinder
+    spec = None
+    for index, part in enumerate(module.split(".")):
+        if spec is not None and spec.submodule_search_locations is None:
+            return None # the parent is a plain module
+        path = spec.submodule_search_locations if spec is not None else None
+        spec = PathFinder.find_spec(".".join(module.split(".")[:index + 1]), path)
+        if spec is None:
+            return None
+    if spec.origin and spec.origin.endswith(".py"):
+        return spec.origin
+    return None
+
+def _source_tree(module):
+    """Compile the source of a module without executing it. Returns the
+    parsed tree, or None if the module has no Python source."""
+    path = _source_path(module)
+    if path is None:
+        return None
+    with open(path, "rb") as f:
+        source = f.read()
+    # Compiling first raises the same SyntaxError the import would
+    compile(source, path, "exec", dont_inherit=True)
+    return ast.parse(source, path)
+
+def _precheck(module, name, requires):
+    """Statically check what grading_import is about to import, so broken
+    submissions are rejected without running any of their code"""
+    requires = list(requires)
+    tree = None
+    if name is not None:
+        tree = _source_tree(f"{module}.{name}")
+        if tree is not None:
+            # `name` is a submodule, `requires` are its attributes
+            module = f"{module}.{name}"
+        else:
+            requires.insert(0, name)
+    if tree is None:
+        tree = _source_tree(module)
+    if tree is None or not requires:
+        return
+    defined = _defined_names(tree)
+    if defined is None:
+        return
+    for symbol in requires:
+        if symbol not in defined:
+            raise AttributeError(f"module '{module}' has no attribute '{symbol}'")
+
 import_errors = []
-def grading_import(module, name=None):
+import_metrics = [] # one dict per grading_import call
+def grading_import(module, name=None, requires=()):
+    """Import a module (or `name` from a module) of the submission. Failures
+    are recorded in import_errors and reported as a hint by every test.
+    `requires` lists names the imported module must define at top level."""
+    budget = Budget.from_config("import")
+    profile = Profile(f"import-{len(import_metrics)}-{module}{'.' + name if name else ''}").start() if profile_dir() else None
+    measurement = Measurement().start()
     try:
-        if name is not None:
-            result = __import__(module, fromlist=[name])
-            return getattr(result, name)
-        else:
-            return __import__(module)
+        with budget:
+            _precheck(module, name, requires)
+            if name is not None:
+                result = __import__(module, fromlist=[name])
+                return getattr(result, name)
+            else:
+                return __import__(module)
     except ImportError as e:
         import_errors.append((module, name, e))
         return None
+    except BudgetExceeded as e:
+        if e.budget is not budget:
+            raise
+        import_errors.append((module, name, e))
+        return None
+    except MemoryError as e:
+        if budget.memory_limit:
+            e = budget.memory_exceeded()
+        import_errors.append((module, name, e))
+        return None
     except BaseException as e:
         import_errors.append((module, name, e))
         return None
+    finally:
+        import_metrics.append({"module": module, "name": name, **measurement.stop()})
+        if profile is not None:
+            profile.stop()
+
+SOLUTION_DIR = "solution"
+
+def reference_import(module, name=None):
+    """Import solution/<module>.py of the sample solution (or `name` from it),
+    e.g. to compare the submission with it using AccessTestCase.fuzz. It is
+    loaded from its file under a module name of its own, so it does not
+    replace the submission's module, and its output is discarded."""
+    path = f"{SOLUTION_DIR}/{module.replace('.', '/')}.py"
+    # On ACCESS, only the grading files are available while grading
+    grading_files = task_config().get("files", {}).get("grading", [])
+    if task_config() and not any(path == f or path.startswith(f.rstrip("/") + "/") for f in grading_files):
+        raise GradingException(f"{path} must be listed in the grading files of config.toml")
+    key = "_reference_" + module.replace(".", "_")
+    reference = sys.modules.get(key)
+    if reference is None:
+        import importlib.util
+        spec = importlib.util.spec_from_file_location(key, path)
+        reference = importlib.util.module_from_spec(spec)
+        sys.modules[key] = reference
+        try:
+            with CapturedOutput(), CapturedOutput("stderr"):
+                spec.loader.exec_module(reference)
+        except BaseException:
+            del sys.modules[key]
+            raise
+    return reference if name is None else getattr(reference, name)
+
+# Results of the sample solution, precomputed by universal/expected.py for
+# the inputs declared in grading/expected_inputs.py. The file consists of
+#   header: magic, format version, number of entries, length of the metadata
+#   metadata: JSON, with the hash of the solution files the results stem from
+#   index: (hash of key, offset of record) per entry, sorted by hash
+#   records: key length, value length, key, value
+# where a key is b"<module.function>\0<repr(args)>" and a value is the repr of
+# the result, so the file does not depend on the Python version.
+EXPECTED_VALUES = "grading/expected.dat"
+EXPECTED_MAGIC = b"ACCESSEV"
+EXPECTED_VERSION = 1
+EXPECTED_HEADER = "<8sHII"
+EXPECTED_ENTRY = "<QQ"
+EXPECTED_RECORD = "<II"
+
+def expected_key(function, args):
+    return f"{function}\0{args!r}".encode()
+
+def expected_key_hash(key):
+    import hashlib
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+def solution_digest(paths):
+    """Hash of the solution files, to tell whether precomputed results are stale"""
+    import hashlib
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        with open(path, "rb") as f:
+            content = f.read()
+        digest.update(f"{path}\0{len(content)}\0".encode())
+        digest.update(content)
+    return digest.hexdigest()
+
+class ExpectedValues:
+    """Looks up precomputed results in the memory-mapped file, so neither the
+    file is read as a whole nor the solution is run while grading"""
+
+    def __init__(self, path=EXPECTED_VALUES):
+        import json
+        import mmap
+        import struct
+        self.path = path
+        with open(path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, metadata_length = struct.unpack_from(EXPECTED_HEADER, self._data)
+        if magic != EXPECTED_MAGIC or version != EXPECTED_VERSION:
+            raise GradingException(f"{path} is not an expected values file of version {EXPECTED_VERSION}, "
+                                   "rebuild it with universal/expected.py")
+        self._index = struct.calcsize(EXPECTED_HEADER) + metadata_length
+        self.metadata = json.loads(self._data[struct.calcsize(EXPECTED_HEADER):self._index])
+        # The solution is not available on ACCESS, but locally it is, so
+        # forgetting to rebuild after changing it is caught there
+        files = self.metadata["solution_files"]
+        if all(os.path.isfile(file) for file in files) and solution_digest(files) != self.metadata["solution_digest"]:
+            raise GradingException(f"{path} is out of date, rebuild it with universal/expected.py")
+
+    def lookup(self, function, args):
+        import struct
+        key = expected_key(function, tuple(args))
+        key_hash = expected_key_hash(key)
+        entry_size = struct.calcsize(EXPECTED_ENTRY)
+        # Binary search for the first entry with this hash
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if struct.unpack_from(EXPECTED_ENTRY, self._data, self._index + middle * entry_size)[0] < key_hash:
+                low = middle + 1
+            else:
+                high = middle
+        for position in range(low, self.count):
+            entry_hash, offset = struct.unpack_from(EXPECTED_ENTRY, self._data, self._index + position * entry_size)
+            if entry_hash != key_hash:
+                break
+            key_length, value_length = struct.unpack_from(EXPECTED_RECORD, self._data, offset)
+            start = offset + struct.calcsize(EXPECTED_RECORD)
+            if self._data[start:start + key_length] == key:
+                value = self._data[start + key_length:start + key_length + value_length]
+                return ast.literal_eval(value.decode())
+        raise GradingException(f"No precomputed result of {function}{tuple(args)!r} in {self.path}, "
+                               "declare the input in grading/expected_inputs.py and rebuild it with universal/expected.py")
+
+_expected_values = None
+def expected_value(function, *args):
+    """The precomputed result of the sample solution's `module.function` for the args"""
+    global _expected_values
+    if _expected_values is None:
+        _expected_values = ExpectedValues()
+    return _expected_values.lookup(function, args)
 
 
 class AccessTestSuite(TestSuite):
-    def __init__(self, max_points, test_classes):
+    def __init__(self, max_points, test_classes, parallel=False, processes=None, isolate=False):
         super().__init__()
         self.test_classes = test_classes
         self.max_points = max_points
+        # Opt-in: False, "classes" (or True) or "methods", see _shards
+        self.parallel = "classes" if parallel is True else parallel
+        self.processes = processes
+        # Opt-in: every test method in a fresh child, see _run_isolated
+        self.isolate = isolate
         self.test_names = []
+        self._class_tests = []
         for test_class in self.test_classes:
             tests = defaultTestLoader.loadTestsFromTestCase(test_class)
             self.addTests(tests)
+            self._class_tests.append(list(tests))
             self.test_names.extend(test_class._test_names())
 
     def run(self, result, debug=False):
-        # run the tests in the suite
-        super().run(result, debug)
-        max_weight = 0
-        awarded_weight = 0
-        # We prioritize failure hints, because they are more useful.
-        failure_hints = []
-        error_hints = []
-        missing = []
-        for test_name in self.test_names:
-            test_name, weight, hint, isError, isSuccess = astuple(result.grade_results[test_name])
-            if hint == MISSING_HINT:
-                missing.append(test_name)
-            max_weight += weight
-            if isSuccess:
-                awarded_weight += weight
-            if isError:
-                error_hints.append(hint)
+        _open_grade_log(self.max_points, [weighted_test_name
+                                          for test_class in self.test_classes
+                                          for weighted_test_name in test_class._weighted_test_names()])
+        _timestamps["tests_started"] = time.time()
+        try:
+            # If the submission could not be imported, no test can pass, so
+            # don't bother running them
+            if import_errors:
+                self._skip_all(result)
+            # run the tests in the suite
+            elif self.isolate and not debug:
+                self._run_isolated(result)
+            elif self.parallel and not debug and "fork" in _start_methods():
+                self._run_parallel(result)
             else:
-                failure_hints.append(hint)
+                super().run(result, debug)
+        finally:
+            _close_grade_log()
+        _timestamps["tests_finished"] = time.time()
+        self._write_grade_results(result)
+        return result
+
+    def _skip_all(self, result):
+        hint = import_failure_hint()
+        for test_class in self.test_classes:
+            for test_name, weight in test_class._weighted_test_names():
+                result.record(GradeResult(test_name, weight, hint))
+
+    def _shards(self):
+        """Groups of tests that run together in one worker process"""
+        if self.parallel == "methods":
+            return [[test] for tests in self._class_tests for test in tests]
+        return [tests for tests in self._class_tests if tests]
+
+    def _run_parallel(self, result):
+        """Run the shards in forked worker processes and merge their results
+        back in suite order, so the outcome is identical to a serial run"""
+        global _parallel_suite
+        from concurrent.futures import ProcessPoolExecutor
+        from concurrent.futures.process import BrokenProcessPool
+        import multiprocessing
+        self._shard_list = self._shards()
+        processes = self.processes or os.cpu_count() or 1
+        processes = max(1, min(processes, len(self._shard_list)))
+        verbosity = 2 if result.showAll else 1 if result.dots else 0
+        _parallel_suite = self
+        sys.stdout.flush()
+        sys.stderr.flush()
+        try:
+            with ProcessPoolExecutor(processes, multiprocessing.get_context("fork")) as pool:
+                futures = [pool.submit(_run_shard, index, result.descriptions, verbosity)
+                           for index in range(len(self._shard_list))]
+                for index, future in enumerate(futures):
+                    try:
+                        outcome = future.result()
+                    except BrokenProcessPool:
+                        # A worker died (e.g. the submission called os._exit),
+                        # so run this shard here like a serial run would
+                        outcome = _run_shard(index, result.descriptions, verbosity)
+                    outcome.merge_into(result)
+        finally:
+            _parallel_suite = None
+
+    def _run_isolated(self, result):
+        """Run every test method in a child forked from this process, so it
+        starts from the state right before the suite started: the submission
+        has only been imported by the grading module, and nothing a previous
+        test did to it (or imported) is visible. The children send their
+        results back, which are merged in suite order. Runs `processes`
+        children at once if the suite is also parallel, else one."""
+        global _parallel_suite
+        import multiprocessing
+        from multiprocessing.connection import wait
+        self._shard_list = [[test] for tests in self._class_tests for test in tests]
+        if "fork" not in _start_methods():
+            # At least let every test import the submission afresh
+            for tests in self._shard_list:
+                modules = set(sys.modules)
+                TestSuite(tests).run(result)
+                for module in set(sys.modules) - modules:
+                    del sys.modules[module]
+            return
+        context = multiprocessing.get_context("fork")
+        processes = (self.processes or os.cpu_count() or 1) if self.parallel else 1
+        verbosity = 2 if result.showAll else 1 if result.dots else 0
+        _parallel_suite = self
+        outcomes = {}
+        running = {} # Map of connection: (index, process)
+        pending = list(range(len(self._shard_list)))
+        merged = 0
+        try:
+            while merged < len(self._shard_list):
+                while pending and len(running) < processes:
+                    index = pending.pop(0)
+                    receiver, sender = context.Pipe(duplex=False)
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                    process = context.Process(target=_run_isolated_shard,
+                                              args=(index, result.descriptions, verbosity, sender))
+                    process.start()
+                    # Only the child may hold the sending end, so that the
+                    # receiving end sees the end of file if the child dies
+                    sender.close()
+                    running[receiver] = (index, process)
+                for receiver in wait(list(running)):
+                    index, process = running.pop(receiver)
+                    try:
+                        outcomes[index] = receiver.recv()
+                    except EOFError:
+                        outcomes[index] = None
+                    receiver.close()
+                    process.join()
+                # Merge in suite order, as soon as possible to keep the output flowing
+                while merged in outcomes:
+                    outcome = outcomes.pop(merged)
+                    if outcome is None:
+                        self._record_unfinished(self._shard_list[merged][0], result)
+                    else:
+                        outcome.merge_into(result)
+                    merged += 1
+        finally:
+            _parallel_suite = None
+
+    def _record_unfinished(self, test, result):
+        """Results of a test whose process died, like for a killed run"""
+        prefix = f"{type(test).__name__}>{test._testMethodName}"
+        for test_name, weight in type(test)._weighted_test_names():
+            if test_name == prefix or test_name.startswith(prefix + "["):
+                result.record(GradeResult(test_name, weight, UNFINISHED_HINT))
+
+    def _write_grade_results(self, result):
+        grade_results = [result.grade_results[test_name] for test_name in self.test_names]
+        missing = [r.test_name for r in grade_results if r.hint == MISSING_HINT]
         if len(missing) > 0:
             print(f"ERROR: grade_results not written; missing hints for: {', '.join(missing)}")
             sys.exit(1)
-        awarded_points = (awarded_weight / max_weight) * self.max_points
-        grading_results = {"points": awarded_points,
-                           "hints": failure_hints + error_hints}
-        with open('grade_results.json', 'w') as grade_results_file:
-            json.dump(grading_results, grade_results_file)
+        write_grade_results(self.max_points, grade_results)
+
+def write_grade_results(max_points, grade_results, path=GRADE_RESULTS):
+    """Write grade_results.json for GradeResults given in hint priority order"""
+    max_weight = 0
+    awarded_weight = 0
+    # We prioritize failure hints, because they are more useful.
+    failure_hints = []
+    error_hints = []
+    for grade_result in grade_results:
+        weight, hint = grade_result.weight, grade_result.hint
+        isError, isSuccess = grade_result.isError, grade_result.success
+        max_weight += weight
+        if isSuccess:
+            awarded_weight += weight
+        if isError:
+            error_hints.append(hint)
+        else:
+            failure_hints.append(hint)
+    import json
+    awarded_points = (awarded_weight / max_weight) * max_points
+    grading_results = {"points": awarded_points,
+                       "hints": failure_hints + error_hints}
+    report = None
+    if metrics_enabled():
+        report = metrics_report(grade_results)
+        grading_results["metrics"] = {
+            "import_time": report["import_time"],
+            "test_time": report["test_time"],
+            "tests": {r["test_name"]: r["metrics"] for r in report["tests"]},
+        }
+    with open(path, 'w') as grade_results_file:
+        json.dump(grading_results, grade_results_file)
+    if report is not None:
+        # Written last, so that the report covers writing the results
+        _timestamps["results_written"] = time.time()
+        with open(os.path.join(os.path.dirname(path), GRADE_METRICS), 'w') as report_file:
+            json.dump(report, report_file, indent=2)
 
+def metrics_report(grade_results):
+    """Timing and memory of every grading_import and test of this run"""
+    tests = [{"test_name": r.test_name, "success": r.success, "isError": r.isError, "metrics": r.metrics}
+             for r in grade_results]
+    return {
+        "imports": import_metrics,
+        "import_time": sum(m["wall_time"] for m in import_metrics),
+        "tests": tests,
+        "test_time": sum(t["metrics"]["wall_time"] for t in tests if t["metrics"]),
+        "timestamps": _timestamps,
+    }
 
-        return result
+_grade_log = None
+_grade_log_owner = None
+
+def _open_grade_log(max_points, weighted_test_names, path=GRADE_LOG):
+    global _grade_log, _grade_log_owner
+    import json
+    # Truncate, then append, so forked workers can safely write to it too
+    open(path, "w").close()
+    _grade_log = open(path, "a", buffering=1)
+    _grade_log.write(json.dumps({"max_points": max_points,
+                                 "task": task_config().get("slug"),
+                                 "test_names": [name for name, _ in weighted_test_names],
+                                 "weights": [weight for _, weight in weighted_test_names]}) + "\n")
+    _grade_log_owner = os.getpid()
+    try:
+        signal.signal(signal.SIGTERM, _on_terminate)
+    except ValueError: # not in the main thread
+        pass
+
+def _log_grade_result(grade_result):
+    if _grade_log is not None:
+        import json
+        _grade_log.write(json.dumps(asdict(grade_result)) + "\n")
+
+def _close_grade_log():
+    global _grade_log
+    if _grade_log is not None:
+        _grade_log.close()
+        _grade_log = None
+    try:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    except ValueError:
+        pass
+
+def _on_terminate(signum, frame):
+    # Forked workers inherit this handler, only the grading process finalizes
+    if os.getpid() == _grade_log_owner:
+        _grade_log.flush()
+        finalize_grade_results()
+    os._exit(128 + signum)
+
+def finalize_grade_results(log_path=GRADE_LOG, results_path=GRADE_RESULTS):
+    """Write grade_results.json from the GradeResults logged so far. Tests
+    that did not finish award no points and get UNFINISHED_HINT. Returns
+    False if the log does not even contain the header."""
+    import json
+    header = None
+    logged = {}
+    try:
+        with open(log_path) as log:
+            for line in log:
+                try:
+                    entry = json.loads(line)
+                except ValueError: # the last line may have been cut off
+                    continue
+                if "test_names" in entry:
+                    header = entry
+                else:
+                    logged[entry["test_name"]] = GradeResult(**entry)
+    except OSError:
+        return False
+    if header is None:
+        return False
+    grade_results = [logged.get(name, GradeResult(name, weight, UNFINISHED_HINT))
+                     for name, weight in zip(header["test_names"], header["weights"])]
+    write_grade_results(header["max_points"], grade_results, results_path)
+    return True
+
+def _start_methods():
+    import multiprocessing
+    return multiprocessing.get_all_start_methods()
+
+# The suite being run in parallel, inherited by the forked workers
+_parallel_suite = None
+
+def _run_shard(index, descriptions, verbosity):
+    from io import StringIO
+    from unittest.runner import _WritelnDecorator
+    output = StringIO()
+    result = AccessResult(_WritelnDecorator(output), descriptions, verbosity)
+    imports = len(import_metrics)
+    TestSuite(_parallel_suite._shard_list[index]).run(result)
+    return ShardOutcome(result, output.getvalue(), import_metrics[imports:])
+
+def _run_isolated_shard(index, descriptions, verbosity, connection):
+    """Entry point of a child of AccessTestSuite._run_isolated"""
+    connection.send(_run_shard(index, descriptions, verbosity))
+    connection.close()
+
+class ShardTest:
+    """Stands in for a test of a worker process when printing its errors"""
+    def __init__(self, description):
+        self.description = description
+
+    def __str__(self):
+        return self.description
+
+    def shortDescription(self):
+        return None
+
+class ShardOutcome:
+    """The picklable part of an AccessResult produced by a worker process"""
+    def __init__(self, result, output, imports=()):
+        def describe(entries):
+            return [(result.getDescription(test), text) for test, text in entries]
+        self.output = output
+        self.imports = list(imports) # import_metrics of grading_import calls in the worker
+        self.tests_run = result.testsRun
+        self.should_stop = result.shouldStop
+        self.grade_results = result.grade_results
+        self.errors = describe(result.errors)
+        self.failures = describe(result.failures)
+        self.skipped = describe(result.skipped)
+        self.expected_failures = describe(result.expectedFailures)
+        self.unexpected_successes = [result.getDescription(test) for test in result.unexpectedSuccesses]
+
+    def merge_into(self, result):
+        def wrap(entries):
+            return [(ShardTest(description), text) for description, text in entries]
+        result.stream.write(self.output)
+        result.stream.flush()
+        result.testsRun += self.tests_run
+        result.shouldStop = result.shouldStop or self.should_stop
+        result.grade_results.update(self.grade_results)
+        import_metrics.extend(self.imports)
+        result.errors.extend(wrap(self.errors))
+        result.failures.extend(wrap(self.failures))
+        result.skipped.extend(wrap(self.skipped))
+        result.expectedFailures.extend(wrap(self.expected_failures))
+        result.unexpectedSuccesses.extend(ShardTest(d) for d in self.unexpected_successes)
 
 class AccessResult(TextTestResult):
     def __init__(self, stream, descriptions, verbosity):
         super().__init__(stream, descriptions, verbosity)
         self.grade_results = {} # Map of test_name: GradeResult
         self.grade_errors = {} # Map of test_name: GradeResult
+        self._profile = None
+
+    def startTest(self, test):
+        super().startTest(test)
+        # Covers the whole test, including setUp, postprocess and the
+        # formatting of tracebacks by the result
+        if profile_dir():
+            name = f"{type(test).__name__}>{test._testMethodName}" if isinstance(test, TestCase) else test.id()
+            self._profile = Profile(name).start()
 
     def stopTest(self, test):
+        if self._profile is not None:
+            self._profile.stop()
+            self._profile = None
         super().stopTest(test)
         if test.grade_result != None:
-            self.grade_results[test.grade_result.test_name] = test.grade_result
+            self.record(test.grade_result)
+        # The cases that ran are logged already, see _record_case
+        for grade_result in getattr(test, "case_results", ())[getattr(test, "_recorded_cases", 0):]:
+            self.record(grade_result)
+
+    def record(self, grade_result):
+        self.grade_results[grade_result.test_name] = grade_result
+        _log_grade_result(grade_result)
 
     def addSuccess(self, test):
         super().addSuccess(test)
@@ -106,6 +1021,204 @@ class GradeResult:
     hint: str
     isError: bool = False
     success: bool = False
+    metrics: dict = None # see Measurement
+    error_type: str = None # name of the exception, if isError
+
+# AST node counts by code object (or by class or module), computed once per process
+_node_counts = {}
+
+def ast_node_count(snippet):
+    """Number of AST nodes of the source of a function, class or module"""
+    key = getattr(snippet, "__code__", snippet)
+    node_count = _node_counts.get(key)
+    if node_count is None:
+        import inspect
+        import textwrap
+        tree = ast.parse(textwrap.dedent(inspect.getsource(snippet)))
+        # ast.walk is iterative, so deeply nested code cannot exhaust the recursion limit
+        node_count = _node_counts[key] = sum(1 for _ in ast.walk(tree))
+    return node_count
+
+@dataclass
+class Case:
+    """One row of a case table, see cases()"""
+    args: tuple = ()
+    expected: object = None
+    weight: int = 1
+    # A format string, filled in with the args ({0}, {1}, ...), the kwargs and
+    # {args}, {expected} and {actual}, or a function of (case, actual)
+    hint: object = None
+    name: str = None # identifies the case in the test name, defaults to its index
+    # A function of (actual, expected) that returns whether the case passed,
+    # defaults to comparing them with ==
+    check: object = None
+    kwargs: dict = field(default_factory=dict)
+
+    def label(self, index):
+        return self.name if self.name is not None else str(index)
+
+    def matches(self, actual):
+        if self.check is None:
+            return actual == self.expected
+        return self.check(actual, self.expected)
+
+    def describe(self, actual):
+        """The hint for this case, given the value the submission returned"""
+        if self.hint is None:
+            return MISSING_HINT
+        if callable(self.hint):
+            return self.hint(self, actual)
+        return self.hint.format(*self.args, **{**self.kwargs, "args": self.args,
+                                               "expected": self.expected, "actual": actual})
+
+def cases(table, hint=None, check=None):
+    """Run a test method once per Case of the table. The method gets the case
+    and returns the actual value, which is compared to case.expected. Every
+    case is graded separately with its own weight and hint; `hint` and `check`
+    are the defaults for cases that do not set them."""
+    from dataclasses import replace
+    table = [replace(case, hint=case.hint if case.hint is not None else hint,
+                     check=case.check if case.check is not None else check)
+             for case in table]
+    def decorator(func):
+        def wrapper(self):
+            self._run_cases(func)
+        wrapper.access_cases = table
+        return wrapper
+    return decorator
+
+# Strategies generate the inputs for AccessTestCase.fuzz. draw() returns a
+# random value, shrink() yields simpler variants of a value, simplest first.
+class Strategy:
+    def draw(self, rng):
+        raise NotImplementedError
+
+    def shrink(self, value):
+        return iter(())
+
+class Integers(Strategy):
+    def __init__(self, min_value=-1000, max_value=1000):
+        self.min_value = min_value
+        self.max_value = max_value
+
+    def draw(self, rng):
+        # Favor the bounds and small numbers, where the bugs are
+        if rng.random() < 0.2:
+            return rng.choice([self.min_value, self.max_value, self._target()])
+        return rng.randint(self.min_value, self.max_value)
+
+    def _target(self):
+        return min(max(0, self.min_value), self.max_value)
+
+    def shrink(self, value):
+        target = self._target()
+        distance = value - target
+        while distance:
+            yield value - distance
+            distance = int(distance / 2)
+
+class Floats(Strategy):
+    def __init__(self, min_value=-1000.0, max_value=1000.0):
+        self.min_value = min_value
+        self.max_value = max_value
+
+    def draw(self, rng):
+        if rng.random() < 0.2:
+            return float(rng.choice([self.min_value, self.max_value, self._target()]))
+        return rng.uniform(self.min_value, self.max_value)
+
+    def _target(self):
+        return min(max(0.0, self.min_value), self.max_value)
+
+    def shrink(self, value):
+        target = self._target()
+        for candidate in (target, float(round(value)), target + (value - target) / 2):
+            if candidate != value and self.min_value <= candidate <= self.max_value:
+                yield candidate
+
+class Booleans(Strategy):
+    def draw(self, rng):
+        return rng.random() < 0.5
+
+    def shrink(self, value):
+        if value:
+            yield False
+
+class SampledFrom(Strategy):
+    """One of the given values, shrinking towards the first one"""
+    def __init__(self, values):
+        self.values = list(values)
+
+    def draw(self, rng):
+        return rng.choice(self.values)
+
+    def shrink(self, value):
+        for candidate in self.values:
+            if candidate == value:
+                break
+            yield candidate
+
+class Tuples(Strategy):
+    def __init__(self, *strategies):
+        self.strategies = strategies
+
+    def draw(self, rng):
+        return tuple(strategy.draw(rng) for strategy in self.strategies)
+
+    def shrink(self, value):
+        for i, strategy in enumerate(self.strategies):
+            for candidate in strategy.shrink(value[i]):
+                yield value[:i] + (candidate,) + value[i + 1:]
+
+class Lists(Strategy):
+    def __init__(self, elements, min_size=0, max_size=10):
+        self.elements = elements
+        self.min_size = min_size
+        self.max_size = max_size
+
+    def draw(self, rng):
+        return [self.elements.draw(rng) for _ in range(rng.randint(self.min_size, self.max_size))]
+
+    def shrink(self, value):
+        # Shorter first, then simpler elements
+        if len(value) > self.min_size:
+            yield value[:self.min_size]
+            if len(value) // 2 > self.min_size:
+                yield value[:len(value) // 2]
+            for i in range(len(value)):
+                yield value[:i] + value[i + 1:]
+        for i, element in enumerate(value):
+            for candidate in self.elements.shrink(element):
+                yield value[:i] + [candidate] + value[i + 1:]
+
+class Text(Strategy):
+    def __init__(self, alphabet="abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 ",
+                 min_size=0, max_size=10):
+        self._chars = Lists(SampledFrom(alphabet), min_size, max_size)
+
+    def draw(self, rng):
+        return "".join(self._chars.draw(rng))
+
+    def shrink(self, value):
+        for candidate in self._chars.shrink(list(value)):
+            yield "".join(candidate)
+
+FUZZ_HINT = "{call} should return {expected!r}, but it returns {actual!r}."
+FUZZ_ERROR_HINT = "{call} should return {expected!r}, but it raises {error}."
+PERFORMANCE_HINT = "Your implementation is {ratio:.0f}× slower than expected for {call}. Try to find a more efficient algorithm."
+
+def _time_calls(function, args, kwargs, number):
+    """Wall time per call of calling function `number` times"""
+    start = time.perf_counter()
+    for _ in range(number):
+        function(*args, **kwargs)
+    return (time.perf_counter() - start) / number
+
+def import_failure_hint():
+    module, name, e = import_errors[0]
+    if name is None:
+        return f"Failed to import {module}: {e}. Make sure your code runs before submitting."
+    return f"Failed to import {name} from {module}: {e}. Make sure your code runs before submitting."
 
 def weight(weight):
     """Supply the awarded weight for a given test method"""
@@ -115,6 +1228,8 @@ def weight(weight):
             instance = args[0]
             instance.weight[test_name] = weight
             return func(*args, **kwargs)
+        # Known without running the test, e.g. when no test is run at all
+        wrapper.access_weight = weight
         return wrapper
     return decorator
 
@@ -124,24 +1239,37 @@ class AccessTestCase(TestCase):
     def __init__(self, methodName='runTest'):
         super().__init__(methodName)
         self.grade_result = None
+        self.case_results = [] # GradeResults of the cases, see cases()
+        self._recorded_cases = 0 # how many of them the result has logged already
+        self._cases = getattr(getattr(self, methodName, None), "access_cases", None)
+
+    @classmethod
+    def _weighted_test_names(cls):
+        """(name, weight) of every GradeResult of this class, in definition
+        order. A test method with a case table produces one per case."""
+        weighted_test_names = []
+        for name, value in cls.__dict__.items():
+            if not (callable(value) and name.startswith("test")):
+                continue
+            table = getattr(value, "access_cases", None)
+            if table is None:
+                weighted_test_names.append((f"{cls.__name__}>{name}", getattr(value, "access_weight", 1)))
+            else:
+                weighted_test_names.extend((f"{cls.__name__}>{name}[{case.label(index)}]", case.weight)
+                                           for index, case in enumerate(table))
+        return weighted_test_names
 
     @classmethod
     def _test_names(cls):
-        return [f"{cls.__name__}>{name}" for name, value in cls.__dict__.items()
-                if callable(value) and name.startswith("test")]
+        return [name for name, _ in cls._weighted_test_names()]
 
     @classmethod
     def setUpClass(cls):
         # If there are imports problems, skip all tests
         cls.skip_all_tests = False
-        global import_errors
         if import_errors:
-            module, name, e = import_errors[0]
             cls.skip_all_tests = True
-            if name is None:
-                cls.skip_reason = f"Failed to import {module}: {e}. Make sure your code runs before submitting."
-            else:
-                cls.skip_reason = f"Failed to import {name} from {module}: {e}. Make sure your code runs before submitting."
+            cls.skip_reason = import_failure_hint()
         # weight for each test method, as provided using the @weight annotation
         cls.weight = defaultdict(lambda: 1)
         cls._hint = {}
@@ -156,6 +1284,10 @@ class AccessTestCase(TestCase):
         self._initial_errors = len(self._outcome.result.errors)
         self._initial_failures = len(self._outcome.result.failures)
         self._hint = {}
+        self._measurement = Measurement().start()
+        # Time and memory limits, as configured in config.toml. With a case
+        # table, they hold for all cases together.
+        self._budget = Budget.from_config("test").start()
 
     def hint(self, msg=None, lang="en"):
         if msg == None:
@@ -163,10 +1295,14 @@ class AccessTestCase(TestCase):
         self._hint[lang] = msg
 
     def postprocess(self):
+            self._budget.stop()
+            metrics = self._measurement.stop()
             test_name = self._testMethodName
             full_test_name = f"{self.__class__.__name__}>{test_name}"
+            if self._cases is not None:
+                self._postprocess_cases(full_test_name)
             # If we're skipping all tests, give the reason and 0 weight
-            if self.skip_all_tests:
+            elif self.skip_all_tests:
                 self.grade_result = GradeResult(full_test_name, self.weight[test_name], self.skip_reason)
             else:
                 global import_errors
@@ -180,37 +1316,228 @@ class AccessTestCase(TestCase):
                     hint = MISSING_HINT
                 else:
                     hint = self._hint["en"]
-                # If the test resulted in an error, the assertion message is lost,
-                # so we give a generic hint
-                if len(self._outcome.result.errors) > self._initial_errors:
-                    error = self._outcome.result.errors[0]
+                errored = len(self._outcome.result.errors) > self._initial_errors
+                if errored:
+                    error = self._outcome.result.errors[self._initial_errors]
                     error_type = "Error"
                     # Attempt to parse the exception type
                     try:
                         error_type = list(reversed(error[1].splitlines()))[0].split(":")[0]
                     except: pass
+                    if error_type == "MemoryError" and self._budget.memory_limit:
+                        self._budget.memory_exceeded()
+                # Running out of budget is reported as a proper failure, even
+                # if the exception was caught along the way
+                if self._budget.exceeded:
+                    self.grade_result = GradeResult(full_test_name, self.weight[test_name], self._budget.hint())
+                # If the test resulted in an error, the assertion message is lost,
+                # so we give a generic hint
+                elif errored:
                     error_hint = hint + f" (This was caused by an error of type {error_type})."
-                    self.grade_result = GradeResult(full_test_name, self.weight[test_name], error_hint, True)
+                    self.grade_result = GradeResult(full_test_name, self.weight[test_name], error_hint, True,
+                                                    error_type=error_type)
                 # If the test failed properly, we should have a failure hint
                 elif len(self._outcome.result.failures) > self._initial_failures:
                     self.grade_result = GradeResult(full_test_name, self.weight[test_name], hint)
                 else:
                     # Overriding as a success is always OK
                     self.grade_result = GradeResult(full_test_name, self.weight[test_name], None, False, True)
+            if self.grade_result is not None:
+                self.grade_result.metrics = metrics
             self._hint = None
 
+    def _postprocess_cases(self, full_test_name):
+        if self.skip_all_tests:
+            self.case_results = [GradeResult(f"{full_test_name}[{case.label(index)}]", case.weight, self.skip_reason)
+                                 for index, case in enumerate(self._cases)]
+            return
+        # Cases that never ran because the loop was interrupted
+        for index, case in enumerate(self._cases[len(self.case_results):], len(self.case_results)):
+            self.case_results.append(GradeResult(f"{full_test_name}[{case.label(index)}]", case.weight, UNFINISHED_HINT))
+
+    def _run_cases(self, func):
+        """Evaluate every case of the table in a tight loop, without the
+        setUp/postprocess round trip of a test method per case. The cases
+        share the budget of the test: once its time is up, the remaining
+        cases fail with its hint."""
+        import traceback
+        full_test_name = f"{self.__class__.__name__}>{self._testMethodName}"
+        budget = self._budget
+        out_of_time = False
+        failed = 0
+        for index, case in enumerate(self._cases):
+            name = f"{full_test_name}[{case.label(index)}]"
+            if out_of_time:
+                self._record_case(GradeResult(name, case.weight, budget.hint()))
+                failed += 1
+                continue
+            self._hint = {}
+            measurement = Measurement().start()
+            actual = error = None
+            try:
+                actual = func(self, case)
+                passed = case.matches(actual)
+            except KeyboardInterrupt:
+                raise
+            except BaseException as e:
+                error = e
+            if isinstance(error, MemoryError) and budget.memory_limit:
+                budget.memory_exceeded()
+            # Hints given with self.hint() while running the case take
+            # precedence for errors and failed assertions, like in a test method
+            hint = self._hint.get("en") if error is not None else None
+            if budget.exceeded:
+                grade_result = GradeResult(name, case.weight, budget.hint())
+                # Memory is given back after the case, but time is not
+                out_of_time = isinstance(error, BudgetExceeded)
+                if not out_of_time:
+                    budget.exceeded = None
+            elif isinstance(error, AssertionError):
+                grade_result = GradeResult(name, case.weight, hint or case.describe(actual))
+            elif error is not None:
+                error_type = traceback.format_exception_only(type(error), error)[-1].split(":")[0].strip()
+                hint = (hint or case.describe(actual)) + f" (This was caused by an error of type {error_type})."
+                grade_result = GradeResult(name, case.weight, hint, True, error_type=error_type)
+            elif not passed:
+                grade_result = GradeResult(name, case.weight, case.describe(actual))
+            else:
+                grade_result = GradeResult(name, case.weight, None, False, True)
+            # Let go of the value and of the frames the traceback holds, so
+            # that the next case starts with the memory of this one freed
+            actual = error = None
+            grade_result.metrics = measurement.stop()
+            self._record_case(grade_result)
+            failed += not grade_result.success
+        if failed:
+            self.fail(f"{failed} of {len(self._cases)} cases failed")
+
+    def _record_case(self, grade_result):
+        """Log the result of a case right away, so a killed run keeps it"""
+        self.case_results.append(grade_result)
+        record = getattr(self._outcome.result, "record", None)
+        if record is not None and self._recorded_cases == len(self.case_results) - 1:
+            record(grade_result)
+            self._recorded_cases += 1
+
+    def fuzz(self, function, reference, *strategies, cases=1000, timeout=1.0, seed=0,
+             check=None, hint=FUZZ_HINT, error_hint=FUZZ_ERROR_HINT, shrink_steps=500):
+        """Call `function` and `reference` with arguments drawn from the
+        strategies (one per argument) and fail if the results differ (per
+        `check`, default ==) or if `function` raises. Stops after `cases`
+        inputs or `timeout` seconds. A mismatch is shrunk to a simple input,
+        which the hint shows. Inputs for which the reference raises are
+        skipped. The inputs only depend on the seed, so grading is repeatable
+        as long as `cases` runs out before `timeout`."""
+        import copy
+        import random
+        rng = random.Random(seed)
+        name = getattr(function, "__name__", "function")
+
+        def mismatch(args):
+            """None if function agrees with reference on args, else the hint fields"""
+            try:
+                expected = reference(*copy.deepcopy(args))
+            except Exception:
+                return None
+            fields = {"args": args, "expected": expected,
+                      "call": f"{name}({', '.join(map(repr, args))})"}
+            try:
+                actual = function(*copy.deepcopy(args))
+            except Exception as e:
+                return {**fields, "error": type(e).__name__}
+            try:
+                agrees = check(actual, expected) if check is not None else actual == expected
+            except Exception:
+                agrees = False
+            return None if agrees else {**fields, "actual": actual}
+
+        self.hint(f"Calling {name} failed for some inputs.")
+        deadline = time.perf_counter() + timeout
+        found = None
+        checked = 0
+        while checked < cases and found is None and time.perf_counter() < deadline:
+            # Draw in batches, so that drawing and calling are not interleaved
+            batch = [tuple(strategy.draw(rng) for strategy in strategies)
+                     for _ in range(min(100, cases - checked))]
+            for args in batch:
+                checked += 1
+                found = mismatch(args)
+                if found is not None or time.perf_counter() >= deadline:
+                    break
+        if found is None:
+            return
+        # Greedily replace one argument at a time by a simpler one that still fails
+        args = found["args"]
+        improved = True
+        while improved and shrink_steps > 0:
+            improved = False
+            for i, strategy in enumerate(strategies):
+                for candidate in strategy.shrink(args[i]):
+                    shrink_steps -= 1
+                    smaller = mismatch(args[:i] + (candidate,) + args[i + 1:])
+                    if smaller is not None:
+                        args, found, improved = smaller["args"], smaller, True
+                        break
+                    if shrink_steps <= 0:
+                        break
+        self.hint((error_hint if "error" in found else hint).format(**found))
+        self.fail()
+
+    def assert_performance(self, function, reference, *args, factor=10, repeats=5, warmup=1,
+                           min_time=0.01, hint=PERFORMANCE_HINT, **kwargs):
+        """Fail if `function` is more than `factor` times slower than
+        `reference` when called with the same arguments. Both are timed in
+        this process, so the ratio does not depend on the grading machine.
+        After `warmup` calls each, both are timed `repeats` times, taking
+        turns, each time in a loop of at least `min_time` seconds, and the
+        fastest times are compared. The arguments must not be modified by
+        the calls."""
+        name = getattr(function, "__name__", "function")
+        call = f"{name}({', '.join([*map(repr, args), *(f'{k}={v!r}' for k, v in kwargs.items())])})"
+        self.hint(f"Calling {call} failed.")
+        import math
+        for _ in range(warmup):
+            reference(*args, **kwargs)
+        # Loop often enough that the timer resolution does not matter, but
+        # not much longer than that
+        number = max(1, math.ceil(min_time / max(_time_calls(reference, args, kwargs, 1), 1e-9)))
+        reference_times = [_time_calls(reference, args, kwargs, number)]
+        function_times = [_time_calls(function, args, kwargs, 1) for _ in range(max(1, warmup))]
+        # No amount of noise makes up for this, so don't spend more time on it
+        if min(function_times) < 4 * factor * reference_times[0]:
+            # The same loop as the reference, unless that takes longer than min_time
+            function_number = min(number, max(1, math.ceil(min_time / max(min(function_times), 1e-9))))
+            function_times = []
+            for _ in range(repeats):
+                reference_times.append(_time_calls(reference, args, kwargs, number))
+                function_times.append(_time_calls(function, args, kwargs, function_number))
+        ratio = min(function_times) / min(reference_times)
+        if ratio > factor:
+            self.hint(hint.format(call=call, ratio=ratio, factor=factor, time=min(function_times),
+                                  reference_time=min(reference_times)))
+            self.fail()
+
     def reject_template(self, snippet, min_ast_nodes=20,
             hint="You must implement more of the solution before resubmitting"):
         self.hint(hint)
-        import inspect
-        import ast
-        def visit(root):
-            return 1 + sum(map(visit, ast.iter_child_nodes(root)))
-        tree = ast.parse(inspect.getsource(snippet))
-        node_count = visit(tree)
-        if node_count < min_ast_nodes:
+        if ast_node_count(snippet) < min_ast_nodes:
             self.fail()
 
 class TestRunner(TextTestRunner):
     def __init__(self):
         super().__init__(verbosity=2, resultclass=AccessResult)
+
+_timestamps["harness_imported"] = time.time()
+
+def reset_timestamps():
+    """Start the timestamps afresh in a child forked to grade a submission
+    (see batch.py), where the harness counts as imported at the fork"""
+    now = time.time()
+    _timestamps.clear()
+    _timestamps.update(harness_import_started=now, harness_imported=now)
+
+if __name__ == "__main__":
+    # Recover grade_results.json after grading was killed
+    if sys.argv[1:2] != ["finalize"]:
+        sys.exit("usage: python harness.py finalize [grade_results.jsonl [grade_results.json]]")
+    sys.exit(0 if finalize_grade_results(*sys.argv[2:4]) else 1)
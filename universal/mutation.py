@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Mutants of a reference implementation, i.e. buggy variants for testing tasks.
+
+    python universal/mutation.py [-n <budget>] [--seed <seed>] <reference.py>
+
+A mutant applies one of these operators to one place of the reference:
+
+    boundary   a comparison shifted or negated, e.g. '<=' instead of '<'
+    operator   an arithmetic or boolean operator swapped, e.g. '-' instead of '+'
+    branch     the body or the else branch of an if dropped
+    constant   an integer off by one, or a boolean flipped
+
+Mutants whose normalized AST (without positions and docstrings) equals the
+reference or an earlier mutant are dropped, so equivalent edits count once.
+At most `budget` mutants are drawn, taking turns between the operators, at
+random but reproducibly: the default seed is the reference's source. The
+testing task harness runs the student's tests against the mutants (see
+TestingTaskHarness) and reports the share it detected as a mutation score.
+Without `-n`, this prints every mutant of the reference.
+"""
+import argparse
+import ast
+import copy
+import hashlib
+import random
+import sys
+from functools import partial
+
+# Operator type: replacement type
+COMPARE_SWAPS = {ast.Lt: ast.LtE, ast.LtE: ast.Lt, ast.Gt: ast.GtE, ast.GtE: ast.Gt,
+                 ast.Eq: ast.NotEq, ast.NotEq: ast.Eq, ast.In: ast.NotIn, ast.NotIn: ast.In}
+BINOP_SWAPS = {ast.Add: ast.Sub, ast.Sub: ast.Add, ast.Mult: ast.Div, ast.Div: ast.Mult,
+               ast.FloorDiv: ast.Div, ast.Mod: ast.FloorDiv, ast.Pow: ast.Mult}
+BOOLOP_SWAPS = {ast.And: ast.Or, ast.Or: ast.And}
+SYMBOLS = {ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">=", ast.Eq: "==", ast.NotEq: "!=",
+           ast.In: "in", ast.NotIn: "not in", ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/",
+           ast.FloorDiv: "//", ast.Mod: "%", ast.Pow: "**", ast.And: "and", ast.Or: "or"}
+OPERATORS = ("boundary", "operator", "branch", "constant")
+
+def _set_compare_op(index, op, node):
+    node.ops[index] = op()
+
+def _set_op(op, node):
+    node.op = op()
+
+def _set_value(value, node):
+    node.value = value
+
+def _drop_body(node):
+    node.body = [ast.Pass()]
+
+def _drop_orelse(node):
+    node.orelse = []
+
+def mutations(node):
+    """(operator, description, mutate) of every mutation of a node, where
+    mutate(node) applies it to (a copy of) the node in place"""
+    if isinstance(node, ast.Compare):
+        for index, op in enumerate(node.ops):
+            new = COMPARE_SWAPS.get(type(op))
+            if new:
+                yield ("boundary", f"'{SYMBOLS[new]}' instead of '{SYMBOLS[type(op)]}'",
+                       partial(_set_compare_op, index, new))
+    elif isinstance(node, (ast.BinOp, ast.AugAssign)):
+        new = BINOP_SWAPS.get(type(node.op))
+        if new:
+            yield "operator", f"'{SYMBOLS[new]}' instead of '{SYMBOLS[type(node.op)]}'", partial(_set_op, new)
+    elif isinstance(node, ast.BoolOp):
+        new = BOOLOP_SWAPS[type(node.op)]
+        yield "operator", f"'{SYMBOLS[new]}' instead of '{SYMBOLS[type(node.op)]}'", partial(_set_op, new)
+    elif isinstance(node, ast.If):
+        yield "branch", "a skipped if branch", _drop_body
+        if node.orelse:
+            yield "branch", "a skipped else branch", _drop_orelse
+    elif isinstance(node, ast.Constant):
+        if isinstance(node.value, bool):
+            yield "constant", f"{not node.value} instead of {node.value}", partial(_set_value, not node.value)
+        elif isinstance(node.value, int):
+            for value in (node.value + 1, node.value - 1):
+                yield "constant", f"{value} instead of {node.value}", partial(_set_value, value)
+
+def normalized_hash(tree):
+    """Hash of an AST that ignores positions and docstrings"""
+    tree = copy.deepcopy(tree)
+    for node in ast.walk(tree):
+        if (isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)) and node.body and
+                isinstance(node.body[0], ast.Expr) and isinstance(node.body[0].value, ast.Constant) and
+                isinstance(node.body[0].value.value, str)):
+            node.body = node.body[1:] or [ast.Pass()]
+    return hashlib.sha256(ast.dump(tree).encode()).hexdigest()
+
+def enclosing_functions(tree):
+    """{id(node): name of the innermost function around it}"""
+    functions = {}
+    def visit(node, name):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            name = node.name
+        functions[id(node)] = name
+        for child in ast.iter_child_nodes(node):
+            visit(child, name)
+    visit(tree, None)
+    return functions
+
+def generate(source, budget=None, seed=None):
+    """[(description, source)] of up to `budget` distinct mutants of a source"""
+    tree = ast.parse(source)
+    nodes = list(ast.walk(tree))
+    functions = enclosing_functions(tree)
+    candidates = {operator: [] for operator in OPERATORS}
+    for index, node in enumerate(nodes):
+        for operator, description, mutate in mutations(node):
+            function = functions[id(node)]
+            where = f"in {function}()" if function else "at the top level"
+            candidates[operator].append((index, f"{description} {where}", mutate))
+    rng = random.Random(source if seed is None else seed)
+    for operator in OPERATORS:
+        rng.shuffle(candidates[operator])
+    # Take turns between the operators, so that e.g. the many constants do
+    # not crowd out the few comparisons when the budget is small
+    order = []
+    while any(candidates.values()):
+        for operator in OPERATORS:
+            if candidates[operator]:
+                order.append(candidates[operator].pop())
+    seen = {normalized_hash(tree)}
+    mutants = []
+    for index, description, mutate in order:
+        if budget is not None and len(mutants) >= budget:
+            break
+        mutant = copy.deepcopy(tree)
+        # ast.walk visits the copy in the same order as the original
+        mutate(next(node for i, node in enumerate(ast.walk(mutant)) if i == index))
+        ast.fix_missing_locations(mutant)
+        key = normalized_hash(mutant)
+        if key in seen:
+            continue
+        try:
+            mutated = ast.unparse(mutant)
+            compile(mutated, "<mutant>", "exec")
+        except (SyntaxError, ValueError):
+            continue
+        seen.add(key)
+        mutants.append((description, mutated))
+    return mutants
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print the mutants of a reference implementation.")
+    parser.add_argument("reference", help="Python file of a correct implementation")
+    parser.add_argument("-n", "--budget", type=int, help="maximum number of mutants (default: all)")
+    parser.add_argument("--seed", help="seed of the random choice of mutants (default: the source)")
+    args = parser.parse_args(argv)
+
+    with open(args.reference) as f:
+        source = f.read()
+    for description, mutated in generate(source, args.budget, args.seed):
+        print(f"# Hint: {description}")
+        print(mutated)
+        print()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
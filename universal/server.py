@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Long-lived grading server for one task, and its client.
+
+    python universal/server.py serve <task_dir> [-s <socket>]
+    python universal/server.py grade <submission_dir> [-s <socket>]
+    python universal/server.py stop [-s <socket>]
+
+`serve` imports the harness and the modules used by the grading tests once
+(see batch.py), then listens on a Unix domain socket. For every submission it
+receives, it forks a child from this warm process that grades the submission
+exactly like ACCESS would, in a private copy of the task, so a request pays
+neither the interpreter start nor the harness import.
+
+`grade` sends a copy of the task's `task/` folder to the server and prints
+the contents of its `grade_results.json`, plus the exit code of the grading
+process. The protocol is one JSON object per line:
+
+    {"submission": "/abs/path"}  ->  {"exitcode": 0, "points": 2.0, "hints": [...]}
+    {"command": "stop"}          ->  {"stopped": true}
+
+Invalid requests, and requests not sent within REQUEST_TIMEOUT seconds, are
+answered with {"error": "..."}.
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from multiprocessing.connection import wait
+
+from batch import BatchGrader
+
+SOCKET_FILE = "access-grading.sock"
+# Seconds a client has to send its request line
+REQUEST_TIMEOUT = 10
+MAX_REQUEST_SIZE = 1 << 20
+
+def read_line(connection):
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = connection.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+def send_line(connection, message):
+    try:
+        connection.sendall(json.dumps(message).encode() + b"\n")
+    except OSError: # the client went away
+        pass
+    connection.close()
+
+class GradingServer:
+
+    def __init__(self, task_dir, path=SOCKET_FILE):
+        self.grader = BatchGrader(task_dir)
+        self.path = os.path.abspath(path)
+        self.running = {} # Map of process sentinel: (connection, process)
+        self.reading = {} # Map of connection: [request received so far, deadline]
+
+    def serve(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        listener.listen()
+        print(f"Grading '{self.grader.config.get('slug')}' on {self.path}", file=sys.stderr)
+        try:
+            stopping = False
+            while not stopping or self.running:
+                # Read the requests in this loop too, so that a slow client
+                # does not hold up the others or the finished children
+                timeout = None
+                if self.reading:
+                    timeout = max(0, min(deadline for _, deadline in self.reading.values()) - time.monotonic())
+                ready = wait(([] if stopping else [listener]) + list(self.reading) + list(self.running), timeout)
+                for sentinel in ready:
+                    if sentinel is listener:
+                        connection, _ = listener.accept()
+                        # Neither reading nor answering may block for long
+                        connection.settimeout(REQUEST_TIMEOUT)
+                        self.reading[connection] = [b"", time.monotonic() + REQUEST_TIMEOUT]
+                    elif sentinel in self.reading:
+                        stopping = self.receive(sentinel) or stopping
+                    else:
+                        connection, process = self.running.pop(sentinel)
+                        process.join()
+                        send_line(connection, self.finish(process))
+                now = time.monotonic()
+                for connection, (_, deadline) in list(self.reading.items()):
+                    if stopping or now >= deadline:
+                        del self.reading[connection]
+                        send_line(connection, {"error": "server is stopping" if stopping else "request timed out"})
+        finally:
+            listener.close()
+            os.remove(self.path)
+
+    def receive(self, connection):
+        """Read what a client sent; handles its request once the line is
+        complete and returns whether to stop"""
+        data = self.reading[connection][0]
+        try:
+            chunk = connection.recv(65536)
+        except OSError:
+            chunk = b""
+        data += chunk
+        if chunk and not data.endswith(b"\n") and len(data) < MAX_REQUEST_SIZE:
+            self.reading[connection][0] = data
+            return False
+        del self.reading[connection]
+        return self.handle(connection, data)
+
+    def handle(self, connection, line):
+        """Start grading the requested submission; returns whether to stop"""
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            send_line(connection, {"error": f"invalid request: {e}"})
+            return False
+        if not isinstance(request, dict):
+            send_line(connection, {"error": "invalid request: not a JSON object"})
+            return False
+        if request.get("command") == "stop":
+            send_line(connection, {"stopped": True})
+            return True
+        submission = request.get("submission")
+        if not isinstance(submission, str) or not os.path.isdir(submission):
+            send_line(connection, {"error": f"not a directory: {submission!r}"})
+            return False
+        process = self.grader.start(submission, tempfile.mkdtemp(prefix="access-server-"))
+        self.running[process.sentinel] = (connection, process)
+        return False
+
+    def finish(self, process):
+        try:
+            return self.grader.finish(process)
+        finally:
+            shutil.rmtree(process.output_dir, ignore_errors=True)
+
+def request(message, path=SOCKET_FILE):
+    """Send a request to a running server and return its answer"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(path)
+        connection.sendall(json.dumps(message).encode() + b"\n")
+        return json.loads(read_line(connection))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grade submissions of one task with a long-lived, warm server.")
+    parser.add_argument("-s", "--socket", default=SOCKET_FILE, help=f"Unix socket of the server (default: {SOCKET_FILE})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="start a server for a task")
+    serve.add_argument("task_dir", help="task directory containing config.toml and grading/")
+    grade = commands.add_parser("grade", help="grade a submission with a running server")
+    grade.add_argument("submission", help="directory with a copy of task/")
+    stop = commands.add_parser("stop", help="stop a running server once its current requests are done")
+    # Also accepted after the command, without overriding one given before it
+    for command in (serve, grade, stop):
+        command.add_argument("-s", "--socket", default=argparse.SUPPRESS, help="Unix socket of the server")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        GradingServer(args.task_dir, args.socket).serve()
+        return 0
+    if args.command == "stop":
+        request({"command": "stop"}, args.socket)
+        return 0
+    result = request({"submission": os.path.abspath(args.submission)}, args.socket)
+    json.dump(result, sys.stdout, indent=2)
+    print()
+    return 0 if "points" in result else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Columnar store of the grading results of many submissions.
+
+    python universal/store.py <store_dir> ingest <results_dir> [--task <slug>]
+    python universal/store.py <store_dir> pass-rates [--task <slug>]
+    python universal/store.py <store_dir> points [--task <slug>]
+    python universal/store.py <store_dir> hints [--task <slug>] [-n <count>]
+
+`ingest` adds every `grade_results.json` found below <results_dir> (e.g. the
+output directory of batch.py), together with the per-test results of the
+`grade_results.jsonl` next to it. The task slug is taken from the
+`summary.json` of batch.py in the directory or one of its parents, unless
+given with --task. Submissions are keyed by the absolute path of their
+directory, and those that are already stored are skipped, so ingesting a
+directory again only adds the new submissions.
+
+The store keeps one array per column in a file of its own, one row per
+submission and one row per test result, and every distinct string (task
+slugs, submission names, test names, hints) once. Rows are only ever
+appended. `meta.json` records how many rows are complete, so a reader never
+sees a half-written ingest, and the next ingest overwrites it. The queries
+read the few columns they need in one go instead of parsing JSON files:
+the pass rate of every test, the distribution of the points per task and
+the most common first hints per task.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from array import array
+from collections import Counter, defaultdict
+from itertools import compress
+
+from batch import LOG_FILE, RESULTS_FILE, SUMMARY_FILE
+
+STORE_VERSION = 2
+META_FILE = "meta.json"
+STRINGS_FILE = "strings.jsonl"
+# Outcome of a test result
+SUCCESS, FAILURE, ERROR = 0, 1, 2
+NO_HINT = -1
+# Column name: (table, array typecode)
+COLUMNS = {
+    "submission_task": ("submissions", "I"),
+    "submission_name": ("submissions", "I"),
+    "submission_path": ("submissions", "I"), # absolute path of the directory, the key of a submission
+    "submission_points": ("submissions", "d"),
+    "submission_first_hint": ("submissions", "i"), # NO_HINT if it got full points
+    "test_submission": ("tests", "I"), # row of the submission
+    "test_name": ("tests", "I"),
+    "test_weight": ("tests", "d"),
+    "test_hint": ("tests", "i"),
+    "test_outcome": ("tests", "B"),
+}
+
+class ResultStore:
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self.path(META_FILE)) as f:
+                self.meta = json.load(f)
+        except FileNotFoundError:
+            self.meta = {"version": STORE_VERSION, "byteorder": sys.byteorder,
+                         "itemsizes": {name: array(code).itemsize for name, (_, code) in COLUMNS.items()},
+                         "rows": {"submissions": 0, "tests": 0}, "strings": 0, "strings_size": 0}
+        if (self.meta["version"] != STORE_VERSION or self.meta["byteorder"] != sys.byteorder or
+                any(self.meta["itemsizes"][name] != array(code).itemsize for name, (_, code) in COLUMNS.items())):
+            raise ValueError(f"{directory} was written by another version or on another platform")
+        self.strings = []
+        with open(self.path(STRINGS_FILE), "a+b") as f:
+            f.seek(0)
+            for line in f.read(self.meta["strings_size"]).splitlines():
+                self.strings.append(json.loads(line))
+        self.ids = {string: index for index, string in enumerate(self.strings)}
+        self._columns = {}
+        self._pending = {name: array(code) for name, (_, code) in COLUMNS.items()}
+        self._pending_strings = []
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def intern(self, string):
+        index = self.ids.get(string)
+        if index is None:
+            index = self.ids[string] = len(self.strings)
+            self.strings.append(string)
+            self._pending_strings.append(string)
+        return index
+
+    def column(self, name):
+        """The committed rows of a column"""
+        column = self._columns.get(name)
+        if column is None:
+            table, code = COLUMNS[name]
+            column = array(code)
+            try:
+                with open(self.path(name), "rb") as f:
+                    column.fromfile(f, self.meta["rows"][table])
+            except FileNotFoundError:
+                pass
+            self._columns[name] = column
+        return column
+
+    def add(self, task, name, grade_results, log=None, path=None):
+        """Add the contents of a grade_results.json and, if available, the
+        GradeResults of its grade_results.jsonl"""
+        pending = self._pending
+        submission = self.meta["rows"]["submissions"] + len(pending["submission_task"])
+        hint = next((h for h in grade_results.get("hints", []) if h is not None), None)
+        pending["submission_task"].append(self.intern(task))
+        pending["submission_name"].append(self.intern(name))
+        pending["submission_path"].append(self.intern(name if path is None else path))
+        pending["submission_points"].append(grade_results["points"])
+        pending["submission_first_hint"].append(NO_HINT if hint is None else self.intern(hint))
+        for result in log or ():
+            pending["test_submission"].append(submission)
+            pending["test_name"].append(self.intern(result["test_name"]))
+            pending["test_weight"].append(result["weight"])
+            pending["test_hint"].append(NO_HINT if result["hint"] is None else self.intern(result["hint"]))
+            pending["test_outcome"].append(SUCCESS if result["success"] else ERROR if result["isError"] else FAILURE)
+
+    def commit(self):
+        """Append the added rows to the column files and make them visible"""
+        added = {"submissions": len(self._pending["submission_task"]), "tests": len(self._pending["test_submission"])}
+        for name, rows in self._pending.items():
+            table, code = COLUMNS[name]
+            committed = self.meta["rows"][table] * rows.itemsize
+            with open(self.path(name), "ab") as f:
+                # Drop whatever an interrupted commit left behind
+                f.truncate(committed)
+                rows.tofile(f)
+        with open(self.path(STRINGS_FILE), "ab") as f:
+            f.truncate(self.meta["strings_size"])
+            f.write(b"".join(json.dumps(s).encode() + b"\n" for s in self._pending_strings))
+            self.meta["strings_size"] = f.tell()
+        self.meta["strings"] = len(self.strings)
+        for table, rows in added.items():
+            self.meta["rows"][table] += rows
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(tmp, self.path(META_FILE))
+        self._pending = {name: array(code) for name, (_, code) in COLUMNS.items()}
+        self._pending_strings = []
+        self._columns = {}
+
+    def _selected(self, tasks, task):
+        """Which rows of a column of task ids belong to a task slug"""
+        task_id = self.ids.get(task, -1)
+        return (t == task_id for t in tasks)
+
+    def pass_rates(self, task=None):
+        """{(task, test_name): (passed, total)} over all test results"""
+        submission_tasks = self.column("submission_task")
+        tasks = array("I", map(submission_tasks.__getitem__, self.column("test_submission")))
+        keys = zip(tasks, self.column("test_name"))
+        passed = (outcome == SUCCESS for outcome in self.column("test_outcome"))
+        if task is not None:
+            selected = array("B", self._selected(tasks, task))
+            keys, passed = compress(keys, selected), compress(passed, selected)
+        keys = list(keys)
+        totals = Counter(keys)
+        passes = Counter(compress(keys, passed))
+        return {(self.strings[t], self.strings[n]): (passes[t, n], total) for (t, n), total in totals.items()}
+
+    def points(self, task=None):
+        """{task: Counter of points}"""
+        tasks = self.column("submission_task")
+        rows = zip(tasks, self.column("submission_points"))
+        if task is not None:
+            rows = compress(rows, self._selected(tasks, task))
+        distribution = defaultdict(Counter)
+        for (t, points), count in Counter(rows).items():
+            distribution[self.strings[t]][points] += count
+        return dict(distribution)
+
+    def first_hints(self, task=None, n=10):
+        """{task: [(hint, count), ...]} of the n most common first hints"""
+        tasks = self.column("submission_task")
+        rows = zip(tasks, self.column("submission_first_hint"))
+        if task is not None:
+            rows = compress(rows, self._selected(tasks, task))
+        by_task = defaultdict(Counter)
+        for (t, hint), count in Counter(rows).items():
+            if hint != NO_HINT:
+                by_task[self.strings[t]][self.strings[hint]] = count
+        return {t: hints.most_common(n) for t, hints in by_task.items()}
+
+def read_log(path):
+    """The GradeResults of a grade_results.jsonl, None if there is none"""
+    try:
+        with open(path) as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    # The first line is the header with the test names. A killed run may
+    # leave a cut off last line, and a retried test is logged again, so the
+    # last complete entry of every test counts, like in finalize_grade_results
+    results = {}
+    for line in lines[1:]:
+        try:
+            result = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(result, dict) and "test_name" in result:
+            results[result["test_name"]] = result
+    return list(results.values())
+
+def find_task(directory, root):
+    """The task slug from the closest summary.json of batch.py"""
+    while True:
+        try:
+            with open(os.path.join(directory, SUMMARY_FILE)) as f:
+                return json.load(f).get("task")
+        except (OSError, ValueError):
+            pass
+        if os.path.samefile(directory, root) or os.path.dirname(directory) == directory:
+            return None
+        directory = os.path.dirname(directory)
+
+def ingest(store, root, task=None, batch_size=10000):
+    """Add every grade_results.json below root that is not stored yet;
+    returns the number added"""
+    root = os.path.abspath(root)
+    stored = set(store.column("submission_path"))
+    added = 0
+    for directory, _, names in os.walk(root):
+        if RESULTS_FILE not in names or store.ids.get(directory, -1) in stored:
+            continue
+        try:
+            with open(os.path.join(directory, RESULTS_FILE)) as f:
+                grade_results = json.load(f)
+        except (OSError, ValueError):
+            continue
+        slug = task or find_task(directory, root) or "unknown"
+        store.add(slug, os.path.relpath(directory, root), grade_results, read_log(os.path.join(directory, LOG_FILE)),
+                  directory)
+        added += 1
+        if added % batch_size == 0:
+            store.commit()
+    store.commit()
+    return added
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Store and query the grading results of many submissions.")
+    parser.add_argument("store", help="store directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("ingest", help="add the grading results below a directory")
+    command.add_argument("results", help="directory with grade_results.json files, e.g. the output of batch.py")
+    command.add_argument("--task", help="task slug of the results (default: from summary.json)")
+    for name, description in (("pass-rates", "pass rate of every test"), ("points", "points distribution per task"),
+                              ("hints", "most common first hints per task")):
+        command = commands.add_parser(name, help=description)
+        command.add_argument("--task", help="only this task slug")
+        if name == "hints":
+            command.add_argument("-n", type=int, default=10, help="hints per task (default: 10)")
+    args = parser.parse_args(argv)
+
+    store = ResultStore(args.store)
+    if args.command == "ingest":
+        print(f"Added {ingest(store, args.results, args.task)} results", file=sys.stderr)
+    elif args.command == "pass-rates":
+        for (task, test_name), (passed, total) in sorted(store.pass_rates(args.task).items()):
+            print(f"{task:<30} {test_name:<60} {passed / total:>6.1%} of {total}")
+    elif args.command == "points":
+        for task, distribution in sorted(store.points(args.task).items()):
+            total = sum(distribution.values())
+            for points, count in sorted(distribution.items()):
+                print(f"{task:<30} {points:>8.2f} {count:>8} {count / total:>6.1%}")
+    else:
+        for task, hints in sorted(store.first_hints(args.task, args.n).items()):
+            for hint, count in hints:
+                print(f"{task:<30} {count:>8}  {hint}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
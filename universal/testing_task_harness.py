@@ -6,11 +6,18 @@ import ast
 from shutil import rmtree
 from shutil import copyfile
 
-import sys
-try: from universal.harness import *
-except: sys.path.append("../../universal/"); from harness import *
+# Grading modules either import this module from the universal package or
+# put universal/ on the path first
+try: from .harness import *
+except ImportError: from harness import *
 
 PREFIX_HINT = "# Hint:"
+# Bump to invalidate the cached results, e.g. when evaluating them changes
+RESULT_KEY_VERSION = b"access-testing-task-2"
+# Kill rate assumed for a test without any statistics
+UNKNOWN_KILL_RATE = 0.5
+# Tests kept per buggy solution in the kill statistics
+MAX_KILL_STATS_TESTS = 50
 
 class TestIdentificationVisitor(ast.NodeVisitor):
 
@@ -50,11 +57,13 @@ class TestIdentificationVisitor(ast.NodeVisitor):
                     self.num_asserts += 1
 
 class Solution:
-    def __init__(self, path, hint, should_pass):
+    def __init__(self, path, hint, should_pass, timeout=None):
         self.path = path
         self.hint = hint
         self.should_pass = should_pass
         self.should_fail = not should_pass
+        # Seconds after which the run is stopped and counts as crashed
+        self.timeout = timeout
 
     def __gt__(self, other):
         if isinstance(other, Solution):
@@ -69,12 +78,100 @@ class Solution:
         return f"""Solution({self.path}, pass:{"OK" if self.should_pass else "FAIL"}, hint:'{self.hint}')"""
 
 
+class KillStats:
+    """How often the tests of the student's test suites failed (killed) each
+    buggy solution or mutant, kept in a small JSON file of the form
+    {task: {solution digest: {test id: [kills, runs]}}}. The solutions of a
+    task are fixed, and only the MAX_KILL_STATS_TESTS most useful tests are
+    kept per solution, so the file does not grow with the submissions."""
+
+    def __init__(self, path=None, task=None):
+        self.path = path
+        self.task = task or "unknown"
+        self.solutions = self.load().get(self.task, {})
+        self.added = {} # Counts since the last save, merged into the file by save()
+
+    def load(self):
+        if not self.path:
+            return {}
+        try:
+            import json
+            with open(self.path) as f:
+                stats = json.load(f)
+            return stats if isinstance(stats, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def rates(self, solution):
+        """{test id: kill rate} of a solution digest, smoothed so that one
+        run does not decide"""
+        return {test: (kills + 1) / (runs + 2) for test, (kills, runs) in self.solutions.get(solution, {}).items()}
+
+    def record(self, solution, events):
+        """Count the tests a child reported for a solution digest"""
+        for event in events:
+            if event.get("status") in ("success", "failure", "error"):
+                for counts in (self.solutions, self.added):
+                    test = counts.setdefault(solution, {}).setdefault(event["test"], [0, 0])
+                    test[0] += event["status"] != "success"
+                    test[1] += 1
+
+    def save(self):
+        """Add the new counts to the file. Concurrent graders merge their
+        counts under a lock instead of overwriting each other's."""
+        if not self.path or not self.added:
+            return
+        import json
+        import tempfile
+        try:
+            import fcntl
+        except ImportError: # no locking, the counts of a concurrent save may get lost
+            fcntl = None
+        # Lock the file itself, so that nothing is left behind. It is replaced
+        # on every save, so whoever waited for the lock of the old file tries
+        # again with the new one.
+        while True:
+            lock = open(self.path, "a")
+            if not fcntl:
+                break
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if os.path.samestat(os.fstat(lock.fileno()), os.stat(self.path)):
+                    break
+            except OSError:
+                pass
+            lock.close()
+        with lock:
+            stats = self.load()
+            solutions = stats.setdefault(self.task, {})
+            for solution, tests in self.added.items():
+                counts = solutions.setdefault(solution, {})
+                for test, (kills, runs) in tests.items():
+                    total = counts.setdefault(test, [0, 0])
+                    total[0] += kills
+                    total[1] += runs
+                if len(counts) > MAX_KILL_STATS_TESTS:
+                    # Keep the tests that kill most often, then the most tried ones
+                    kept = sorted(counts.items(), key=lambda item: ((item[1][0] + 1) / (item[1][1] + 2), item[1][1]),
+                                  reverse=True)[:MAX_KILL_STATS_TESTS]
+                    solutions[solution] = dict(kept)
+            # Atomic, so that a reader never sees a half-written file
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(stats, f)
+            os.replace(tmp, self.path)
+        self.solutions = solutions
+        self.added = {}
+
+
 class EvalResult:
     def __init__(self, sln, has_crashed, has_ended_successfully, error=None):
         self.sln = sln
         self.has_crashed = has_crashed
         self.has_ended_successfully = has_ended_successfully
         self.error = error
+        # Stopped after sln.timeout, which may only be due to a loaded machine
+        self.timed_out = False
 
     def __gt__(self, other):
         if isinstance(other, EvalResult):
@@ -86,18 +183,134 @@ class EvalResult:
         return f"EvalResult({self.sln}, crash:{self.has_crashed}, success:{self.has_ended_successfully})"
 
 
+def describe_exception(exception, message):
+    """'Type: first line of the message', like the last line of a traceback"""
+    lines = [line for line in message.strip().split("\n") if line.strip()]
+    if "Traceback (most recent call last):" in lines:
+        # unittest reports a module that fails to import with its traceback
+        return lines[-1]
+    message = lines[0] if lines else ""
+    return f"{exception}: {message}" if message else exception
+
+def order_tests(suite, rates):
+    """The tests of a suite by descending kill rate, keeping the tests of a
+    class together, so that its class fixtures still run once"""
+    import unittest
+    def flatten(suite):
+        for test in suite:
+            if isinstance(test, unittest.TestSuite):
+                yield from flatten(test)
+            else:
+                yield test
+    classes = {} # Map of class: its tests, in the order of the suite
+    for test in flatten(suite):
+        classes.setdefault(type(test), []).append(test)
+    rate = lambda test: rates.get(test.id(), UNKNOWN_KILL_RATE)
+    ordered = []
+    for tests in sorted(classes.values(), key=lambda tests: -max(map(rate, tests))):
+        ordered.extend(sorted(tests, key=lambda test: -rate(test)))
+    return ordered
+
+def run_test_module(workspace, module, connection, fail_fast=False, rates=None):
+    """Entry point of the children of TestingTaskHarness.execute_forked: run
+    the unittest tests of a module in the workspace and send one JSON object
+    per test over the connection, then {"done": ...}, or {"crash": ...} if the
+    tests could not be loaded or run. With fail_fast, stop at the first
+    failing test. With kill rates, run the test classes and their tests with
+    the highest rates first."""
+    import builtins
+    import io
+    import json
+    import unittest
+
+    def send(event):
+        connection.send_bytes(json.dumps(event).encode())
+
+    class StreamingResult(unittest.TextTestResult):
+        def report(self, test, status, err=None):
+            event = {"test": test.id(), "status": status}
+            if err is not None:
+                event["exception"] = err[0].__name__
+                event["message"] = str(err[1])
+            send(event)
+        def addSuccess(self, test):
+            super().addSuccess(test)
+            self.report(test, "success")
+        def addFailure(self, test, err):
+            super().addFailure(test, err)
+            self.report(test, "failure", err)
+        def addError(self, test, err):
+            super().addError(test, err)
+            self.report(test, "error", err)
+        def addSkip(self, test, reason):
+            super().addSkip(test, reason)
+            self.report(test, "skip")
+        def addUnexpectedSuccess(self, test):
+            super().addUnexpectedSuccess(test)
+            self.report(test, "unexpected_success")
+
+    # Like a new interpreter in the workspace, that just imported unittest
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    # The task directory of the grading run must not shadow the workspace
+    cwd = os.getcwd()
+    sys.path[:] = [workspace] + [path for path in sys.path if os.path.abspath(path) != cwd]
+    os.chdir(workspace)
+    for name in list(sys.modules):
+        if name == "task" or name.startswith("task."):
+            del sys.modules[name]
+    builtins.input = builtins.input_orig
+    try:
+        tests = unittest.defaultTestLoader.loadTestsFromNames([module])
+        if rates is not None:
+            tests = unittest.TestSuite(order_tests(tests, rates))
+        runner = unittest.TextTestRunner(stream=io.StringIO(), resultclass=StreamingResult, failfast=fail_fast)
+        result = runner.run(tests)
+        send({"done": True, "success": result.wasSuccessful(), "tests_run": result.testsRun})
+    except BaseException as e:
+        send({"crash": True, "exception": type(e).__name__, "message": str(e)})
+    finally:
+        connection.close()
+
+
 class TestingTaskHarness:
 
     def __init__(self,
             test_sources,
             dir_correct = "grading/correct",
             dir_buggy = "grading/buggy",
+            cache_dir = os.environ.get("ACCESS_GRADE_CACHE"),
+            mutants = 0,
+            reference_tests = None,
+            mutation_threshold = 0.8,
+            mutant_timeout = 10,
+            fail_fast = False,
+            kill_stats = os.environ.get("ACCESS_KILL_STATS"),
                 ):
         self.dir_correct = dir_correct
         self.dir_buggy = dir_buggy
+        # Budget of generated buggy variants of the correct solution (see
+        # mutation.py), and the share of them the tests must detect. Only the
+        # mutants that the instructor's complete test suite (in the layout of
+        # the student's tests) detects count, the others may well be
+        # equivalent to the correct solution.
+        self.mutants = mutants
+        self.reference_tests = reference_tests
+        self.mutation_threshold = mutation_threshold
+        self.mutant_timeout = mutant_timeout
+        # Stop the runs against buggy solutions and mutants at the first
+        # failing test, trying the tests that killed the most first
+        self.fail_fast = fail_fast
+        self.kill_stats = KillStats(kill_stats, task_config().get("slug")) if fail_fast else None
+        # Results of earlier runs of the same tests against the same solution
+        self.cache = None
+        if cache_dir:
+            try: from .cache import ResultCache
+            except ImportError: from cache import ResultCache
+            self.cache = ResultCache(cache_dir)
 
         self.test_sources = test_sources[0]           # TODO: should support more than one file
-        self.test_dst = "tmp/" + self.test_sources    # TODO: should be a path where all the multiple test files go
 
         self.cwd = os.getcwd()
 
@@ -107,6 +320,8 @@ class TestingTaskHarness:
         assert os.path.isdir("grading")
         assert os.path.isdir(self.dir_correct)
         assert os.path.isdir(self.dir_buggy)
+        assert not mutants or (reference_tests and os.path.isfile(reference_tests)), \
+            "mutants need reference_tests, a test suite that detects every detectable mutant"
 
         self.generated_tests = []
         self.run()
@@ -127,7 +342,8 @@ class TestingTaskHarness:
         pos_unweighted = self.find_solutions(self.dir_correct, True)
         # number of sample solutions is multiplied by the number of neg solutions to ensure that 
         # a simple self.fail() does not get more than half of the points
-        pos = [pos_unweighted[0] for i in range(len(neg))]
+        # (the mutation score counts like one more buggy solution)
+        pos = [pos_unweighted[0] for i in range(len(neg) + (1 if self.mutants else 0))]
 
         print("Found solutions:")
         for s in pos + neg:
@@ -135,12 +351,66 @@ class TestingTaskHarness:
 
         err = self.submission_has_tests()
         if err == None:
-            res = self.execute(pos + neg)
+            mutant_dir = None
+            mutants = []
+            if self.mutants:
+                mutant_dir, mutants = self.generate_mutants(pos_unweighted[0])
+            try:
+                if mutants:
+                    mutants = self.detectable_mutants(mutants)
+                res = self.execute(pos + neg + mutants)
+            finally:
+                if mutant_dir:
+                    rmtree(mutant_dir, ignore_errors=True)
+            mutants = set(mutants)
+            self.gen_results([r for r in res if r.sln not in mutants])
+            if self.mutants:
+                self.gen_mutation_result([r for r in res if r.sln in mutants])
         else:
-            res = [EvalResult(None, False, False, err)] * (len(pos) + len(neg))
-
-        os.chdir(self.cwd)
-        self.gen_results(res)
+            res = [EvalResult(None, False, False, err)] * (len(pos) + len(neg) + (1 if self.mutants else 0))
+            self.gen_results(res)
+
+    def generate_mutants(self, sln):
+        """A temporary directory with up to self.mutants mutants of a correct
+        solution, and their Solutions"""
+        import tempfile
+        try: from .mutation import generate
+        except ImportError: from mutation import generate
+        with open(os.path.join(self.cwd, sln.path)) as f:
+            source = f.read()
+        mutant_dir = tempfile.mkdtemp(prefix="access-mutants-")
+        mutants = []
+        for i, (description, mutated) in enumerate(generate(source, self.mutants)):
+            path = os.path.join(mutant_dir, f"mutant_{i:03d}.py")
+            with open(path, "w") as f:
+                f.write(mutated)
+            mutants.append(Solution(path, description, False, self.mutant_timeout))
+        print(f"Generated {len(mutants)} mutants of {sln.path}")
+        return mutant_dir, mutants
+
+    def detectable_mutants(self, mutants):
+        """The mutants that the instructor's test suite detects"""
+        print(f"Running {self.reference_tests} against the mutants...")
+        res = self.execute(mutants, self.reference_tests)
+        detectable = [r.sln for r in res if r.has_crashed or not r.has_ended_successfully]
+        print(f"{len(detectable)} of {len(mutants)} mutants are detectable")
+        return detectable
+
+    def gen_mutation_result(self, res):
+        """One generated test for the share of mutants the tests detected"""
+        import random
+        detected = [r for r in res if r.has_crashed or not r.has_ended_successfully]
+        undetected = sorted(r.sln.hint for r in res if r not in detected)
+        score = len(detected) / len(res) if res else 1
+        m = f"Your test suite detected {len(detected)} of {len(res)} generated variants of a correct implementation ({score:.0%})."
+        if undetected:
+            # The same submission always gets the same examples
+            examples = random.Random("\n".join(undetected)).sample(undetected, min(3, len(undetected)))
+            m += " It did not detect e.g. " + "; ".join(examples) + "."
+        self.generated_tests.append(self.create_test_class(
+            f"GeneratedTest_{len(self.generated_tests) + 1}_mutants",
+            m,
+            score >= self.mutation_threshold))
 
     def gen_results(self, res):
         test_num = 0 # each generated class get's a unique name
@@ -185,75 +455,252 @@ class TestingTaskHarness:
                     m,
                     False))
 
-    def execute(self, solutions):
-        res = []
-        for sln in solutions:
-            print("-------------")
-            print(f"Executing {sln}...")
-
-            os.chdir(self.cwd)
-            if os.path.exists("tmp"):
-                rmtree("tmp")
-            os.makedirs("tmp/task")
-
-            print(f"Copying {self.test_sources} to {self.test_dst}...")
-            copyfile(self.test_sources, self.test_dst)
-            SCRIPT_DEST = "tmp/task/script.py"
-            print(f"Copying {sln.path} to {SCRIPT_DEST}...")
-            copyfile(sln.path, SCRIPT_DEST)
-
-            os.chdir("tmp")
-            print("now in: " + os.getcwd())
+    def execute(self, solutions, tests=None):
+        """Run the test suite (the student's, unless another file is given)
+        against every distinct solution, each in a private copy of the task,
+        with up to one solution per CPU at a time. A solution listed several
+        times (for weighting) runs only once, and results in the cache are
+        not computed again."""
+        from concurrent.futures import ThreadPoolExecutor
+        import json
+        import multiprocessing
+        tests = tests or self.test_sources
+        keys = [self.result_key(sln, tests) for sln in solutions]
+        unique = {}
+        for key, sln in zip(keys, solutions):
+            unique.setdefault(key, sln)
+        outcomes = {}
+        if self.cache is not None:
+            for key, sln in unique.items():
+                content = self.cache.get(key)
+                if content is not None:
+                    print(f"Using the cached result for {sln}")
+                    outcomes[key] = json.loads(content)
+        pending = [(key, sln) for key, sln in unique.items() if key not in outcomes]
+        if "fork" in multiprocessing.get_all_start_methods():
+            runs = self.execute_forked([sln for _, sln in pending], tests)
+        else:
+            with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+                runs = list(pool.map(self.execute_solution, [sln for _, sln in pending], [tests] * len(pending)))
+        # Print the logs in the order of the solutions, as if run one by one
+        for (key, sln), (eval_result, log) in zip(pending, runs):
+            print("\n".join(log))
+            outcomes[key] = {"has_crashed": eval_result.has_crashed,
+                             "has_ended_successfully": eval_result.has_ended_successfully,
+                             "error": eval_result.error}
+            # A timeout may not happen again on a less loaded machine
+            if self.cache is not None and not eval_result.timed_out:
+                self.cache.put(key, json.dumps(outcomes[key]).encode())
+        if self.kill_stats is not None:
+            self.kill_stats.save()
+        return sorted(EvalResult(sln, **outcomes[key]) for key, sln in zip(keys, solutions))
+
+    def result_key(self, sln, tests):
+        """Hash of everything that determines the result of running the test
+        suite against a solution"""
+        import hashlib
+        digest = hashlib.sha256(RESULT_KEY_VERSION)
+        if self.fail_fast and sln.should_fail:
+            digest.update(b"fail-fast\0")
+        if sln.timeout is not None:
+            digest.update(b"timeout:%r\0" % sln.timeout)
+        digest.update(tests.encode() + b"\0")
+        for path in (os.path.join(self.cwd, tests), os.path.join(self.cwd, sln.path), __file__):
+            with open(path, "rb") as f:
+                content = f.read()
+            digest.update(b"%d\0" % len(content))
+            digest.update(content)
+        return digest.hexdigest()
+
+    def solution_digest(self, sln):
+        """Hash of a solution's file, the same for every submission"""
+        import hashlib
+        with open(os.path.join(self.cwd, sln.path), "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def prepare_workspace(self, sln, log, tests):
+        """A private directory with the tests and the solution in task/"""
+        import tempfile
+        tmp = tempfile.mkdtemp(prefix="access-testing-")
+        os.makedirs(os.path.join(tmp, "task"))
+
+        test_dst = os.path.join(tmp, tests)
+        os.makedirs(os.path.dirname(test_dst), exist_ok=True)
+        log.append(f"Copying {tests} to {test_dst}...")
+        copyfile(os.path.join(self.cwd, tests), test_dst)
+        SCRIPT_DEST = os.path.join(tmp, "task", "script.py")
+        log.append(f"Copying {sln.path} to {SCRIPT_DEST}...")
+        copyfile(os.path.join(self.cwd, sln.path), SCRIPT_DEST)
+        return tmp
+
+    def execute_forked(self, solutions, tests):
+        """(EvalResult, log) of every solution. The tests run in children
+        forked from this process, which has imported unittest already, with
+        up to one child per CPU at a time. Each child reports the outcome of
+        every test over a pipe (see run_test_module), so nothing is parsed
+        from the console output."""
+        import json
+        import multiprocessing
+        import time
+        from multiprocessing.connection import wait
+        context = multiprocessing.get_context("fork")
+        module = os.path.splitext(os.path.normpath(tests))[0].replace(os.sep, ".")
+        # Only the runs of the student's tests count for the kill statistics
+        kill_stats = self.kill_stats if tests == self.test_sources else None
+        runs = [None] * len(solutions)
+        running = {} # Map of connection: (index, process, workspace, events)
+        deadlines = {} # Map of connection: time at which its child is killed
+        timed_out = set() # indices of the solutions whose child was killed
+        pending = list(range(len(solutions)))
+        processes = os.cpu_count() or 1
+        while pending or running:
+            while pending and len(running) < processes:
+                index = pending.pop(0)
+                sln = solutions[index]
+                log = ["-------------", f"Executing {sln}..."]
+                tmp = self.prepare_workspace(sln, log, tests)
+                log.append(f"running {module} in a forked child in {tmp}...")
+                receiver, sender = context.Pipe(duplex=False)
+                sys.stdout.flush()
+                sys.stderr.flush()
+                if self.fail_fast and sln.should_fail:
+                    # The rates so far, including the runs of this grading
+                    rates = kill_stats.rates(self.solution_digest(sln)) if kill_stats else None
+                    args = (tmp, module, sender, True, rates)
+                else:
+                    args = (tmp, module, sender)
+                process = context.Process(target=run_test_module, args=args)
+                process.start()
+                # Only the child may hold the sending end, so that the
+                # receiving end sees the end of file when the child is gone
+                sender.close()
+                running[receiver] = (index, process, tmp, [])
+                if sln.timeout is not None:
+                    deadlines[receiver] = time.monotonic() + sln.timeout
+                runs[index] = log
+            timeout = max(0, min(deadlines.values()) - time.monotonic()) if deadlines else None
+            ready = wait(list(running), timeout)
+            for receiver, deadline in list(deadlines.items()):
+                if receiver not in ready and time.monotonic() >= deadline:
+                    index, process = running[receiver][:2]
+                    # The pipe sees the end of file once the child is gone
+                    process.kill()
+                    runs[index].append(f"killed after {solutions[index].timeout}s")
+                    timed_out.add(index)
+                    del deadlines[receiver]
+            for receiver in ready:
+                index, process, tmp, events = running[receiver]
+                try:
+                    events.append(json.loads(receiver.recv_bytes()))
+                    continue
+                except EOFError:
+                    pass
+                del running[receiver]
+                deadlines.pop(receiver, None)
+                receiver.close()
+                process.join()
+                rmtree(tmp, ignore_errors=True)
+                if kill_stats and solutions[index].should_fail:
+                    kill_stats.record(self.solution_digest(solutions[index]), events)
+                eval_result = self.evaluate(solutions[index], events)
+                eval_result.timed_out = index in timed_out
+                runs[index] = (eval_result, runs[index])
+        return runs
+
+    def evaluate(self, sln, events):
+        """The EvalResult of the events a child reported for a solution"""
+        import re
+        done = events[-1] if events and "done" in events[-1] else None
+        if done is None:
+            # The child died or the tests could not even be loaded
+            crash = events[-1] if events and "crash" in events[-1] else None
+            error = crash and describe_exception(crash["exception"], crash["message"])
+            if sln.should_pass and error:
+                return EvalResult(sln, True, False,
+                                  f"Running your test suite on a correct implementation failed due to a '{error}'.")
+            return EvalResult(sln, True, False)
+        # unittest reports errors before failures
+        problems = ([e for e in events if e.get("status") == "error"] +
+                    [e for e in events if e.get("status") == "failure"])
+        if sln.should_pass and problems:
+            problem = problems[0]
+            if problem["status"] == "failure":
+                m = f"Your test suite contains a test that fails for a correct implementation ({sln.hint})."
+            elif problem["exception"] == "UserWarning":
+                uw_hint = re.search("@@(.*?)@@", problem["message"])
+                if uw_hint:
+                    m = f"Your test suite failed for a correct implementation. Hint: {uw_hint.group(1)}"
+                else:
+                    m = f"Your test suite failed for a correct implementation: {sln.hint}"
+            else:
+                error = describe_exception(problem["exception"], problem["message"])
+                m = f"Running your test suite on a correct implementation failed due to a '{error}'."
+            return EvalResult(sln, True, False, m)
+        return EvalResult(sln, False, done["success"])
+
+    def execute_solution(self, sln, tests):
+        """The EvalResult of running the test suite against one solution in a
+        new interpreter and the lines to log about it, for platforms without
+        fork"""
+        log = ["-------------", f"Executing {sln}..."]
+        tmp = self.prepare_workspace(sln, log, tests)
+        try:
+            log.append("now in: " + tmp)
 
             #cmd = "/usr/bin/python --version"
-            cmd = "python -m unittest task/tests.py"
-            print(f"executing '{cmd}'...")
-            out = subprocess.Popen(cmd,
-                                   cwd=os.getcwd(),
-                                   shell=True,
+            # (without fork, the order of the tests is not changed)
+            cmd = f"python -m unittest{' -f' if self.fail_fast and sln.should_fail else ''} {tests}"
+            log.append(f"executing '{cmd}'...")
+            # Without a shell in between, so that kill() stops the tests
+            out = subprocess.Popen(cmd.split(),
+                                   cwd=tmp,
                                    stdout=subprocess.PIPE,
                                    stderr=subprocess.STDOUT)
 
-            stdout, stderr = out.communicate()
-
-            if stdout:
-                stdout = stdout.decode("UTF-8")
-            if stderr:
-                stderr = stderr.decode("UTF-8")
-
-            last_line = stdout.split("\n")[-2]
-            has_crashed = not (last_line == "OK" or last_line.startswith(
-                "FAILED")) # fail vs. error
-            has_ended_successfully = not out.returncode
-
-            # handle cases, in which the execution crashed unexpectedly
-            error = self.parse_error(stdout)
-            if sln.should_pass and error:
-                if error == "AssertionError":
-                    m = f"Your test suite contains a test that fails for a correct implementation ({sln.hint})."
-                elif error == "UserWarning":
-                    uw_hint = None
-                    for l in stdout.split("\n"):
-                        if l.startswith("UserWarning"):
-                            idx1 = l.find("@@")
-                            if idx1 != -1:
-                                idx2 = l.find("@@", idx1 + 2)
-                                if idx2 != -1:
-                                    uw_hint = l[idx1 + 2 : idx2]
-                    if uw_hint:
-                        m = f"Your test suite failed for a correct implementation. Hint: {uw_hint}"
-                    else:
-                        m = f"Your test suite failed for a correct implementation: {sln.hint}"
+            try:
+                stdout, stderr = out.communicate(timeout=sln.timeout)
+            except subprocess.TimeoutExpired:
+                out.kill()
+                out.communicate()
+                log.append(f"killed after {sln.timeout}s")
+                eval_result = EvalResult(sln, True, False)
+                eval_result.timed_out = True
+                return eval_result, log
+        finally:
+            rmtree(tmp, ignore_errors=True)
+
+        if stdout:
+            stdout = stdout.decode("UTF-8")
+        if stderr:
+            stderr = stderr.decode("UTF-8")
+
+        last_line = stdout.split("\n")[-2]
+        has_crashed = not (last_line == "OK" or last_line.startswith(
+            "FAILED")) # fail vs. error
+        has_ended_successfully = not out.returncode
+
+        # handle cases, in which the execution crashed unexpectedly
+        error = self.parse_error(stdout)
+        if sln.should_pass and error:
+            if error == "AssertionError":
+                m = f"Your test suite contains a test that fails for a correct implementation ({sln.hint})."
+            elif error == "UserWarning":
+                uw_hint = None
+                for l in stdout.split("\n"):
+                    if l.startswith("UserWarning"):
+                        idx1 = l.find("@@")
+                        if idx1 != -1:
+                            idx2 = l.find("@@", idx1 + 2)
+                            if idx2 != -1:
+                                uw_hint = l[idx1 + 2 : idx2]
+                if uw_hint:
+                    m = f"Your test suite failed for a correct implementation. Hint: {uw_hint}"
                 else:
-                    m = f"Running your test suite on a correct implementation failed due to a '{error}'."
-                res.append(EvalResult(sln, True, False, m))
+                    m = f"Your test suite failed for a correct implementation: {sln.hint}"
             else:
-                res.append(EvalResult(sln, has_crashed, has_ended_successfully))
-
-        os.chdir(self.cwd)
-        if os.path.exists("tmp"):
-            rmtree("tmp")
-        return sorted(res)
+                m = f"Running your test suite on a correct implementation failed due to a '{error}'."
+            return EvalResult(sln, True, False, m), log
+        return EvalResult(sln, has_crashed, has_ended_successfully), log
 
 
     def parse_error(self, stdout):